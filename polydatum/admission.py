@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import deque
+
+from polydatum.errors import Overloaded
+
+
+class _Waiter(object):
+    def __init__(self, lane, enqueued):
+        self.lane = lane
+        self.enqueued = enqueued
+        self.event = threading.Event()
+        self.admitted = False
+        self.shed = False
+
+
+class AdmissionController(object):
+    """
+    Limits the number of concurrently active DataAccessContexts.
+
+    Contexts over ``max_active`` wait in a bounded queue. The queue has
+    priority lanes chosen by the ``priority`` Meta value, earlier lanes are
+    always admitted first. Queue time is watched CoDel style: once every
+    admitted context has waited longer than ``target_delay`` for a full
+    ``interval``, the controller starts shedding. While shedding, contexts
+    that can not be admitted right away fail immediately with ``Overloaded``
+    instead of growing the queue delay.
+
+    Example::
+
+        dm = DataManager(
+            admission_controller=AdmissionController(
+                max_active=50, max_queue=200, lanes=("interactive", "batch")
+            )
+        )
+
+        with dm.dal(meta={"priority": "batch"}) as dal:
+            ...
+    """
+
+    def __init__(
+        self,
+        max_active,
+        max_queue=0,
+        lanes=("interactive", "batch"),
+        meta_key="priority",
+        target_delay=0.005,
+        interval=0.1,
+        max_wait=None,
+    ):
+        """
+        :param max_active: Maximum number of active contexts
+        :param max_queue: Maximum number of contexts waiting for admission
+        :param lanes: Priority lane names, highest priority first. Contexts
+            with a missing or unknown priority use the first lane.
+        :param meta_key: Meta key that holds the lane name
+        :param target_delay: Acceptable queue time in seconds
+        :param interval: Seconds queue time must stay above ``target_delay``
+            before shedding starts
+        :param max_wait: Maximum seconds to wait for admission. The context
+            deadline is always respected.
+        """
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.lanes = tuple(lanes)
+        self.meta_key = meta_key
+        self.target_delay = target_delay
+        self.interval = interval
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._queues = [deque() for __ in self.lanes]
+        self._active = 0
+        self._queued = 0
+        self._shed = 0
+        self._first_above = None
+        self._dropping = False
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def queued(self):
+        return self._queued
+
+    @property
+    def shed(self):
+        """
+        Total number of contexts that were refused admission.
+        """
+        return self._shed
+
+    @property
+    def dropping(self):
+        """
+        True while queue time is above target and new contexts are shed.
+        """
+        return self._dropping
+
+    def after_fork(self):
+        """
+        Reset the lock and the active and queued contexts, which belong to
+        the parent, in a forked child.
+        """
+        self._lock = threading.Lock()
+        self._queues = [deque() for __ in self.lanes]
+        self._active = 0
+        self._queued = 0
+        self._shed = 0
+        self._first_above = None
+        self._dropping = False
+
+    def stats(self):
+        return {"active": self._active, "queued": self._queued, "shed": self._shed}
+
+    def _lane(self, context):
+        try:
+            return self.lanes.index(context.meta.get(self.meta_key))
+        except ValueError:
+            return 0
+
+    def _refuse(self, message):
+        self._shed += 1
+        return Overloaded(message)
+
+    def admit(self, context):
+        """
+        Wait until ``context`` may become active.
+
+        :raises: Overloaded if the context was shed
+        """
+        with self._lock:
+            if self._active < self.max_active and not self._queued:
+                self._active += 1
+                return
+
+            if self._dropping:
+                raise self._refuse("Shedding load, queue delay above target")
+
+            if self._queued >= self.max_queue:
+                raise self._refuse("Admission queue is full")
+
+            waiter = _Waiter(self._lane(context), time.monotonic())
+            self._queues[waiter.lane].append(waiter)
+            self._queued += 1
+
+        timeout = self.max_wait
+        remaining = context.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        waiter.event.wait(timeout)
+
+        with self._lock:
+            if waiter.admitted:
+                return
+            if waiter.shed:
+                raise Overloaded("Shed while queued, queue delay above target")
+            # Timed out waiting
+            self._queues[waiter.lane].remove(waiter)
+            self._queued -= 1
+            self._shed += 1
+        raise Overloaded("Timed out waiting for admission")
+
+    def release(self, context):
+        """
+        Release the slot held by an active ``context`` and hand it to the
+        next waiting context.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for queue in self._queues:
+                while queue:
+                    waiter = queue.popleft()
+                    self._queued -= 1
+                    if self._should_drop(now - waiter.enqueued, now):
+                        waiter.shed = True
+                        self._shed += 1
+                        waiter.event.set()
+                        continue
+
+                    # Hand the slot directly to the waiter
+                    waiter.admitted = True
+                    waiter.event.set()
+                    return
+
+            self._active -= 1
+            self._first_above = None
+            self._dropping = False
+
+    def _should_drop(self, sojourn, now):
+        """
+        CoDel control law on the queue time of a dequeued context.
+        """
+        if sojourn < self.target_delay:
+            self._first_above = None
+            self._dropping = False
+            return False
+
+        if self._first_above is None:
+            self._first_above = now + self.interval
+        elif now >= self._first_above:
+            self._dropping = True
+        return self._dropping
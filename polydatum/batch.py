@@ -0,0 +1,181 @@
+import sys
+
+from polydatum.context import DataAccessContext
+from polydatum.errors import MiddlewareSetupException
+
+
+class BatchTask(object):
+    """
+    The outcome of one task run by a ``BatchContext``.
+    """
+
+    def __init__(self, meta):
+        self.meta = meta
+        self.result = None
+        self.exception = None
+
+    @property
+    def ok(self):
+        return self.exception is None
+
+    def __repr__(self):
+        return "<{} ok={}>".format(self.__class__.__name__, self.ok)
+
+
+class BatchContext(DataAccessContext):
+    """
+    A DataAccessContext that runs many small tasks. Context Middleware is
+    set up once for the batch and Resources are reused across tasks.
+
+    Each task runs in an exception scope: its exception is recorded on
+    the returned ``BatchTask`` and the batch continues. For each task:
+
+    - ``meta`` is the batch Meta updated with the task Meta
+    - ``task_middleware`` runs around the task. Task middleware are
+      generator callables that receive the context and the ``BatchTask``
+      and yield once, like context Middleware. Use them for per-task
+      isolation such as savepoints.
+    - ``unit_of_work`` is flushed when the task succeeds and discarded
+      when it fails
+
+    With ``commit="task"`` Resources are torn down after every task, so
+    each task commits or rolls back on its own and ``on_success`` and
+    ``on_exit`` callbacks run per task. Resources are created again on
+    demand by the next task. With ``commit="batch"`` Resources are torn
+    down when the batch exits. A failed task's writes are then only
+    rolled back if a task middleware does so.
+
+    Example::
+
+        def savepoint(context, task):
+            savepoint = context.db.savepoint()
+            try:
+                yield
+            except Exception:
+                savepoint.rollback()
+                raise
+            else:
+                savepoint.release()
+
+        with dm.batch(task_middleware=[savepoint]) as batch:
+            for message in messages:
+                task = batch.run(
+                    batch.dal.items.process, message, meta={"id": message.id}
+                )
+                if not task.ok:
+                    log.error(task.exception)
+    """
+
+    COMMIT_MODES = ("task", "batch")
+
+    def __init__(
+        self, data_manager, meta=None, timeout=None, commit="batch", task_middleware=()
+    ):
+        """
+        :param commit: ``"task"`` to commit Resources after each task or
+            ``"batch"`` to commit when the batch exits
+        :param task_middleware: Generator callables run around each task
+        """
+        if commit not in self.COMMIT_MODES:
+            raise ValueError(
+                "commit must be one of {}, not {!r}".format(self.COMMIT_MODES, commit)
+            )
+        super(BatchContext, self).__init__(data_manager, meta=meta, timeout=timeout)
+        self.commit = commit
+        self.task_middleware = tuple(task_middleware)
+        self.batch_meta = self.meta
+        self.succeeded = 0
+        self.failed = 0
+
+    def get_task_meta(self, meta=None):
+        """
+        Returns the Meta for a task.
+
+        :param meta: dict-like task Meta, overrides the batch Meta
+        """
+        if not meta:
+            return self.batch_meta
+        return self.batch_meta.derive(meta)
+
+    def run(self, fn, *args, meta=None, **kwargs):
+        """
+        Run ``fn(*args, **kwargs)`` as a task of the batch.
+
+        :param meta: dict-like task Meta
+        :returns: BatchTask with the result or exception of the task
+        :raises: ContextCancelled if the batch was cancelled. Exceptions
+            that are not an ``Exception``, like KeyboardInterrupt, are
+            raised after the task is torn down.
+        """
+        if self._state != "active":
+            raise RuntimeError("Batch must be active to run tasks")
+        self.raise_if_cancelled()
+        # Between tasks is a safe point to recycle Resources
+        self.recycle_resources()
+
+        task = BatchTask(self.get_task_meta(meta))
+        self.meta = task.meta
+        if self.commit == "task":
+            batch_callbacks, self._callbacks = self._callbacks, []
+
+        try:
+            exc_type, exc_value, traceback = self._run_task(task, fn, args, kwargs)
+
+            if self.commit == "task":
+                self._release_resources(exc_type, exc_value, traceback)
+                self._resources = {}
+                self._run_callbacks(exc_value)
+        finally:
+            self.meta = self.batch_meta
+            if self.commit == "task":
+                self._callbacks = batch_callbacks
+
+        if exc_value is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            if not isinstance(exc_value, Exception):
+                raise exc_value.with_traceback(traceback)
+        task.exception = exc_value
+        return task
+
+    def _run_task(self, task, fn, args, kwargs):
+        """
+        Run a task inside its task middleware.
+
+        :returns: ``sys.exc_info()`` of the task exception, if any
+        """
+        exc_type, exc_value, traceback = None, None, None
+        generators = []
+        try:
+            for middleware in self.task_middleware:
+                generator = middleware(self, task)
+                generators.append(generator)
+                try:
+                    next(generator)
+                except StopIteration:
+                    raise MiddlewareSetupException(
+                        "Task middleware %s did not yield on setup." % middleware
+                    )
+
+            task.result = fn(*args, **kwargs)
+
+            unit_of_work, self._unit_of_work = self._unit_of_work, None
+            if unit_of_work is not None:
+                unit_of_work.flush()
+        except BaseException:
+            exc_type, exc_value, traceback = sys.exc_info()
+            unit_of_work, self._unit_of_work = self._unit_of_work, None
+            if unit_of_work is not None:
+                unit_of_work.discard()
+
+        # Same exception handling as context Middleware teardown
+        while generators:
+            generator = generators.pop()
+            try:
+                if self._exit(generator, exc_type, exc_value, traceback):
+                    exc_type, exc_value, traceback = None, None, None
+            except BaseException:
+                exc_type, exc_value, traceback = sys.exc_info()
+
+        return exc_type, exc_value, traceback
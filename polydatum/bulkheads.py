@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Callable
+
+from polydatum.errors import BulkheadFull, ServiceError
+from polydatum.middleware import DalCommandRequest
+
+
+class AdaptiveBulkhead(object):
+    """
+    Concurrency limit that adapts to observed latency (AIMD).
+
+    Callers that exceed the current limit fail fast with ``BulkheadFull``.
+    Every release reports the latency of the work that held the bulkhead.
+    While latency stays under the threshold and the limit is being used,
+    the limit grows by about one per limit's worth of calls. A slow or
+    failed call multiplies the limit by ``backoff``.
+
+    The latency threshold is ``latency_target`` if given, otherwise
+    ``tolerance`` times the best recently observed latency.
+    """
+
+    def __init__(
+        self,
+        limit=10,
+        min_limit=1,
+        max_limit=100,
+        latency_target=None,
+        tolerance=2.0,
+        backoff=0.9,
+    ):
+        """
+        :param limit: Initial concurrency limit
+        :param min_limit: The limit never drops below this
+        :param max_limit: The limit never grows above this
+        :param latency_target: Fixed latency threshold in seconds
+        :param tolerance: Multiple of the baseline latency that is
+            considered slow when there is no ``latency_target``
+        :param backoff: Factor applied to the limit on slow or failed calls
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._limit = float(limit)
+        self._in_flight = 0
+        self._rejected = 0
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def rejected(self):
+        return self._rejected
+
+    def after_fork(self):
+        """
+        Reset the lock and the in flight count, which belongs to the
+        parent, in a forked child. The learned limit is kept.
+        """
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def acquire(self):
+        """
+        :raises: BulkheadFull if the limit has been reached
+        """
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                self._rejected += 1
+                raise BulkheadFull(
+                    "Bulkhead is full ({} in flight)".format(self._in_flight)
+                )
+            self._in_flight += 1
+
+    def release(self, latency, failed=False):
+        """
+        :param latency: Seconds the bulkhead was held
+        :param failed: True if the work failed
+        """
+        with self._lock:
+            saturated = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                # Let the baseline drift up so it tracks the backend
+                # when it gets permanently slower
+                self._baseline *= 1.01
+
+            threshold = self.latency_target
+            if threshold is None:
+                threshold = self._baseline * self.tolerance
+
+            if failed or latency > threshold:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            elif saturated:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+
+class BulkheadMiddleware(object):
+    """
+    Method Middleware that enforces bulkheads per DAL path.
+
+    Bulkheads are looked up by the full path first and then by each
+    shorter prefix, so a bulkhead for ``"search"`` covers every method
+    of the ``search`` Service.
+
+    Example::
+
+        dm = DataManager(
+            dal_middleware=[BulkheadMiddleware({"search": AdaptiveBulkhead(limit=20)})]
+        )
+
+    Install it in the DataManager's ``dal_middleware`` so calls Services
+    make to each other count against the bulkheads too. A DAL created
+    with ``DataAccessLayer(dm, middleware=[...])`` only limits the calls
+    made through that DAL.
+    """
+
+    # Nested calls to a bulkheaded path count against the bulkhead too
+    nested = True
+
+    def __init__(self, bulkheads):
+        """
+        :param bulkheads: Mapping of DAL path to AdaptiveBulkhead
+        """
+        self.bulkheads = dict(bulkheads)
+
+    def after_fork(self):
+        """
+        Reset the bulkheads in a forked child.
+        """
+        for bulkhead in self.bulkheads.values():
+            bulkhead.after_fork()
+
+    def get_bulkhead(self, path):
+        names = [p.name for p in path]
+        while names:
+            bulkhead = self.bulkheads.get(".".join(names))
+            if bulkhead is not None:
+                return bulkhead
+            names.pop()
+
+    def __call__(self, request: DalCommandRequest, handler: Callable):
+        bulkhead = self.get_bulkhead(request.path)
+        if bulkhead is None:
+            return handler(request)
+
+        bulkhead.acquire()
+        start = time.monotonic()
+        failed = False
+        try:
+            return handler(request)
+        except ServiceError as e:
+            # Client errors such as NotFound say nothing about backend health
+            failed = e.code >= 500
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            bulkhead.release(time.monotonic() - start, failed)
@@ -0,0 +1,417 @@
+import mmap
+import os
+import pickle  # nosec
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import blake2b
+
+from polydatum.streams import DalStream
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def cache_key(*parts):
+    """
+    Returns a 16 byte key for ``parts``. Parts are keyed by ``repr()`` so
+    they should have a stable repr, like plain data.
+    """
+    return blake2b(repr(parts).encode("utf-8"), digest_size=16).digest()
+
+
+class SharedMemoryCache(object):
+    """
+    Cache in a memory mapped file that every process on the host can map,
+    for example prefork workers. Put the file on a memory backed file
+    system like ``/dev/shm``.
+
+    The file is a table of fixed size slots. A key can live in any of
+    ``ways`` slots of its bucket, the expired or least recently used slot
+    is replaced. Values larger than a slot are not stored.
+
+    Reads take no lock. Each slot has a sequence number that writers make
+    odd while writing, readers miss if it is odd or changed under them.
+    Writers serialize on a thread lock and a ``lockf`` lock of the file.
+    Last use times are updated without a lock, so LRU is approximate.
+    """
+
+    # seq, value length, key, expires, last used
+    _HEADER = struct.Struct("=II16sdd")
+    _LAST_USED = 32
+    _EMPTY = bytes(16)
+    # File header: magic, slot size, ways, buckets
+    _MAGIC = b"PDCACHE1"
+    _LAYOUT = struct.Struct("=8sIII")
+    _LAYOUT_SIZE = 64
+
+    def __init__(self, path, size=64 * 1024 * 1024, slot_size=4096, ways=4):
+        """
+        :param path: File to map, created if missing
+        :param size: Bytes of slots. Processes sharing ``path`` must use
+            the same ``size``, ``slot_size`` and ``ways``.
+        :param slot_size: Bytes per slot, including a 40 byte header
+        :param ways: Slots per bucket
+        """
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryCache requires fcntl")
+        if slot_size <= self._HEADER.size:
+            raise ValueError("slot_size must be larger than the slot header")
+        self.path = path
+        self.slot_size = slot_size
+        self.ways = ways
+        self.buckets = max(size // slot_size // ways, 1)
+        self.size = self.buckets * ways * slot_size
+        self._lock = threading.Lock()
+
+        layout = self._LAYOUT.pack(self._MAGIC, slot_size, ways, self.buckets)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, self._LAYOUT_SIZE + self.size)
+                    os.pwrite(fd, layout, 0)
+                elif os.pread(fd, self._LAYOUT.size, 0) != layout:
+                    # Every process must agree on where keys live
+                    raise ValueError("{} has a different cache layout".format(path))
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, self._LAYOUT_SIZE + self.size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    @property
+    def max_value_size(self):
+        return self.slot_size - self._HEADER.size
+
+    def _slots(self, key):
+        bucket = int.from_bytes(key[:8], "little") % self.buckets
+        first = bucket * self.ways
+        return [
+            self._LAYOUT_SIZE + (first + i) * self.slot_size for i in range(self.ways)
+        ]
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _write(self, offset, key, value, expires, last_used):
+        """
+        Write a slot. Caller must hold ``_write_lock()``.
+        """
+        seq = struct.unpack_from("=I", self._map, offset)[0] | 1
+        struct.pack_into("=I", self._map, offset, seq)
+        start = offset + self._HEADER.size
+        self._map[start : start + len(value)] = value
+        self._HEADER.pack_into(
+            self._map, offset, seq, len(value), key, expires, last_used
+        )
+        struct.pack_into("=I", self._map, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def get(self, key):
+        """
+        Returns the value bytes for ``key`` or None.
+        """
+        header = self._HEADER
+        for offset in self._slots(key):
+            seq, length, slot_key, expires, __ = header.unpack_from(self._map, offset)
+            if slot_key != key:
+                continue
+            if seq & 1 or (expires and expires < time.time()):
+                return None
+
+            start = offset + header.size
+            value = self._map[start : start + length]
+            if struct.unpack_from("=I", self._map, offset)[0] != seq:
+                # Written while reading
+                return None
+            # Approximate LRU, racing writers just win
+            struct.pack_into("=d", self._map, offset + self._LAST_USED, time.time())
+            return value
+        return None
+
+    def set(self, key, value, ttl=None):
+        """
+        Store ``value`` bytes. Returns False if the value is too large.
+        """
+        if len(value) > self.max_value_size:
+            return False
+
+        now = time.time()
+        with self._write_lock():
+            victim = None
+            victim_rank = None
+            for offset in self._slots(key):
+                __, length, slot_key, expires, last_used = self._HEADER.unpack_from(
+                    self._map, offset
+                )
+                if slot_key == key:
+                    victim = offset
+                    break
+                # Empty, then expired, then least recently used
+                if not length:
+                    rank = (0, 0)
+                elif expires and expires < now:
+                    rank = (1, 0)
+                else:
+                    rank = (2, last_used)
+                if victim_rank is None or rank < victim_rank:
+                    victim, victim_rank = offset, rank
+
+            self._write(victim, key, value, now + ttl if ttl else 0.0, now)
+        return True
+
+    def delete(self, key):
+        with self._write_lock():
+            for offset in self._slots(key):
+                if self._HEADER.unpack_from(self._map, offset)[2] == key:
+                    self._write(offset, self._EMPTY, b"", 0.0, 0.0)
+
+    def clear(self):
+        with self._write_lock():
+            for offset in range(
+                self._LAYOUT_SIZE, self._LAYOUT_SIZE + self.size, self.slot_size
+            ):
+                self._write(offset, self._EMPTY, b"", 0.0, 0.0)
+
+    def after_fork(self):
+        """
+        Reset the thread lock in a forked child. The mapping stays shared,
+        ``lockf`` locks are per process.
+        """
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class DiskCache(object):
+    """
+    Cache of one file per key in ``directory``, a larger and slower tier
+    shared by the processes of a host. Files are replaced atomically so
+    readers never see partial values. Once there are more than
+    ``max_entries`` files, the least recently used are removed.
+    """
+
+    _EXPIRES = struct.Struct("=d")
+
+    def __init__(self, directory, max_entries=10000, cleanup_interval=100):
+        """
+        :param directory: Directory for cache files, created if missing
+        :param max_entries: Files kept after a cleanup
+        :param cleanup_interval: Writes between cleanups
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.cleanup_interval = cleanup_interval
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.hex())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < self._EXPIRES.size:
+            return None
+        (expires,) = self._EXPIRES.unpack_from(data)
+        if expires and expires < time.time():
+            return None
+        try:
+            # Recently used files survive cleanup
+            os.utime(path)
+        except OSError:
+            pass
+        return data[self._EXPIRES.size :]
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else 0.0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._EXPIRES.pack(expires))
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._writes += 1
+        if self._writes % self.cleanup_interval == 0:
+            self.cleanup()
+        return True
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self):
+        """
+        Remove the least recently used files over ``max_entries``.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(".tmp"):
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for __, path in entries[: len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class CacheMiddleware(object):
+    """
+    Method Middleware that caches DAL method results in cache tiers,
+    such as a ``SharedMemoryCache`` backed by a ``DiskCache``.
+
+    Only paths in ``paths`` are cached. Paths match by prefix, like
+    ``BulkheadMiddleware``. The cache key is made of the DAL path, the
+    arguments and the ``meta_keys`` Meta values, so include every Meta
+    value that changes the result (like a tenant or locale). Results are
+    pickled, so the tiers must only be shared with trusted processes.
+    Streaming results are not cached.
+
+    Tiers are tried in order. A hit in a later tier is copied to the
+    earlier tiers. The cache never fails a call: an error reading a tier
+    or unpickling a value, like a class renamed by a deploy, is a miss and
+    an error writing a tier, like a full disk, skips the write. Errors are
+    counted in ``errors``.
+
+    Example::
+
+        cache = CacheMiddleware(
+            [SharedMemoryCache("/dev/shm/app-cache"), DiskCache("/var/cache/app")],
+            paths={"catalog": 300, "users.get_profile": 60},
+            meta_keys=("tenant_id",),
+        )
+        dm = DataManager(dal_middleware=[cache])
+
+    Install it in the DataManager's ``dal_middleware`` so calls Services
+    make to each other are cached too. A DAL created with
+    ``DataAccessLayer(dm, middleware=[cache])`` only caches the calls
+    made through that DAL.
+    """
+
+    # Cached Services calling each other hit the cache too
+    nested = True
+
+    def __init__(self, tiers, paths, meta_keys=()):
+        """
+        :param tiers: Caches with ``get(key)`` and ``set(key, value, ttl)``
+        :param paths: Mapping of DAL path to TTL seconds, None for no TTL
+        :param meta_keys: Meta keys that are part of the cache key
+        """
+        self.tiers = list(tiers)
+        self.paths = dict(paths)
+        self.meta_keys = tuple(meta_keys)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def after_fork(self):
+        """
+        Reset the tiers in a forked child. Called by
+        ``DataManager.after_fork()`` for the middleware of its DALs.
+        """
+        for tier in self.tiers:
+            after_fork = getattr(tier, "after_fork", None)
+            if callable(after_fork):
+                after_fork()
+
+    def get_ttl(self, path):
+        """
+        Returns ``(cached, ttl)`` for the DAL path.
+        """
+        names = [p.name for p in path]
+        while names:
+            name = ".".join(names)
+            if name in self.paths:
+                return True, self.paths[name]
+            names.pop()
+        return False, None
+
+    def get_key(self, request):
+        return cache_key(
+            tuple(p.name for p in request.path),
+            request.args,
+            sorted(request.kwargs.items()),
+            request.ctx.meta.fingerprint(*self.meta_keys),
+        )
+
+    def __call__(self, request, handler):
+        cached, ttl = self.get_ttl(request.path)
+        if not cached:
+            return handler(request)
+
+        key = self.get_key(request)
+        for i, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+                if value is None:
+                    continue
+                # Tiers are only shared with trusted processes
+                result = pickle.loads(value)  # nosec
+            except Exception:
+                self.errors += 1
+                continue
+            self.hits += 1
+            self._set(self.tiers[:i], key, value, ttl)
+            return result
+
+        self.misses += 1
+        result = handler(request)
+        if not isinstance(result, DalStream):
+            try:
+                value = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self.errors += 1
+            else:
+                self._set(self.tiers, key, value, ttl)
+        return result
+
+    def _set(self, tiers, key, value, ttl):
+        for tier in tiers:
+            try:
+                tier.set(key, value, ttl)
+            except Exception:
+                self.errors += 1
@@ -1,23 +1,40 @@
 import importlib
 import json
+import os
+import threading
 
 
 class Config(object):
     """
     Simple configuration object. Keys are accessible as attributes.
     Keys can not be changed once initialized.
+
+    Values are kept in a single dict so lookups are O(1) and the
+    ``items()`` snapshot is only computed once.
     """
 
+    _values = None
+    _items = None
+
     def __init__(self, opts=None):
-        if opts:
-            for k, v in opts.items():
-                object.__setattr__(self, k, v)
+        object.__setattr__(self, "_values", dict(opts) if opts else {})
 
     def __setattr__(self, key, value):
         raise KeyError("Config keys can not be changed.")
 
+    def __getattr__(self, key):
+        if key.startswith("__") or self._values is None:
+            raise AttributeError(key)
+        try:
+            return self._values[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __contains__(self, key):
+        return key in self._values
+
     def get(self, key, default=None):
-        return getattr(self, key, default)
+        return self._values.get(key, default)
 
     def require(self, key):
         """
@@ -29,12 +46,20 @@ class Config(object):
         return value
 
     def items(self):
-        for k in dir(self):
-            if k.isupper():
-                yield (k, self.get(k))
+        """
+        Returns a cached tuple of ``(key, value)`` for all upper case keys,
+        sorted by key.
+        """
+        if self._items is None:
+            object.__setattr__(
+                self,
+                "_items",
+                tuple(sorted((k, v) for k, v in self._values.items() if k.isupper())),
+            )
+        return self._items
 
     def __str__(self):
-        return json.dumps(dict(list(self.items())), indent=2)
+        return json.dumps(dict(self.items()), indent=2)
 
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, self)
@@ -45,8 +70,158 @@ def from_module(module_name):
     Load a configuration module and return a Config
     """
     d = importlib.import_module(module_name)
+    return Config({k: v for k, v in vars(d).items() if k.isupper()})
+
+
+def from_env(prefix, environ=None):
+    """
+    Load all environment variables starting with ``prefix`` and return a
+    Config. The prefix is stripped from the keys. Values that are valid
+    JSON are decoded (``APP_DEBUG=true`` becomes ``True``), all others
+    are kept as strings.
+
+    :param prefix: Environment variable prefix, ex: ``"APP_"``
+    :param environ: Mapping to read from. Defaults to ``os.environ``.
+    """
+    environ = os.environ if environ is None else environ
     config = {}
-    for key in dir(d):
-        if key.isupper():
-            config[key] = getattr(d, key)
+    for key, value in environ.items():
+        if key.startswith(prefix) and len(key) > len(prefix):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            config[key[len(prefix) :]] = value
     return Config(config)
+
+
+def from_json_file(path):
+    """
+    Load a JSON file containing an object and return a Config
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError('"{}" must contain a JSON object.'.format(path))
+    return Config(config)
+
+
+def layered(*sources):
+    """
+    Merge Configs (or dicts) into a single Config. Later sources
+    override earlier ones.
+
+    Example::
+
+        config = layered(
+            from_module("myapp.settings"),
+            from_json_file("/etc/myapp.json"),
+            from_env("MYAPP_"),
+        )
+    """
+    config = {}
+    for source in sources:
+        if isinstance(source, Config):
+            source = source._values
+        config.update(source)
+    return Config(config)
+
+
+class ReloadableConfig(object):
+    """
+    Holds the current Config snapshot produced by ``loader`` and swaps in a
+    new snapshot on ``reload()``. Readers never lock, they always see either
+    the old or the new snapshot, never a mix of both.
+
+    Example::
+
+        config = ReloadableConfig(
+            lambda: layered(from_module("myapp.settings"), from_json_file(path)),
+            paths=[path],
+        )
+        config.reload_if_changed()
+    """
+
+    def __init__(self, loader, paths=()):
+        """
+        :param loader: Callable that takes no arguments and returns a Config
+        :param paths: Files to watch with ``reload_if_changed()``
+        """
+        self._loader = loader
+        self._paths = tuple(paths)
+        self._lock = threading.Lock()
+        self._stamps = self._stat()
+        self._config = loader()
+
+    @property
+    def current(self):
+        """
+        The current Config snapshot. Hold on to the snapshot if you need
+        multiple keys to be consistent with each other.
+        """
+        return self._config
+
+    def _stat(self):
+        stamps = []
+        for path in self._paths:
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _publish(self):
+        stamps = self._stat()
+        config = self._loader()
+        self._stamps = stamps
+        self._config = config
+        return config
+
+    def reload(self):
+        """
+        Resolve the sources again and atomically publish the new snapshot.
+        If the loader raises, the current snapshot is kept.
+
+        :returns: The new Config
+        """
+        with self._lock:
+            return self._publish()
+
+    def reload_if_changed(self):
+        """
+        Reload if any of the watched ``paths`` changed since the last load.
+
+        :returns: True if a new snapshot was published
+        """
+        if self._stat() == self._stamps:
+            return False
+        with self._lock:
+            if self._stat() == self._stamps:
+                # Another thread already reloaded
+                return False
+            self._publish()
+            return True
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        return getattr(self._config, key)
+
+    def __contains__(self, key):
+        return key in self._config
+
+    def get(self, key, default=None):
+        return self._config.get(key, default)
+
+    def require(self, key):
+        return self._config.require(key)
+
+    def items(self):
+        return self._config.items()
+
+    def __str__(self):
+        return str(self._config)
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self._config)
@@ -1,9 +1,23 @@
 import json
 import sys
+import threading
+import time
+import weakref
+from collections import namedtuple
+from concurrent.futures import wait
+from contextlib import contextmanager
+from hashlib import blake2b
+from traceback import format_exception
 
 from werkzeug.local import LocalStack
 
-from .errors import MiddlewareSetupException, PolydatumException, ResourceSetupException
+from .errors import (
+    ContextCancelled,
+    DeadlineExceeded,
+    MiddlewareSetupException,
+    PolydatumException,
+    ResourceSetupException,
+)
 
 # Deprecated (0.8.4) in preference of accessing stack on DataManager
 _ctx_stack = LocalStack()
@@ -29,16 +43,63 @@ def get_active_context():
         return _ctx_stack.top
 
 
+_MISSING = object()
+
+
+class Lazy(object):
+    """
+    Meta value that is computed by ``fn()`` the first time it is read
+    and then cached. Use it for values that are expensive to look up and
+    not needed by every context.
+
+    Example::
+
+        meta = {"user_id": user_id, "user": Lazy(lambda: load_user(user_id))}
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self._value = _MISSING
+        self._lock = threading.Lock()
+
+    @property
+    def evaluated(self):
+        return self._value is not _MISSING
+
+    def get(self):
+        if self._value is _MISSING:
+            with self._lock:
+                if self._value is _MISSING:
+                    self._value = self.fn()
+        return self._value
+
+    def __repr__(self):
+        if self.evaluated:
+            return "<{} {!r}>".format(self.__class__.__name__, self._value)
+        return "<{} {!r}>".format(self.__class__.__name__, self.fn)
+
+
 class Meta(object):
     """
     Read only meta data. Keys are accessible as attributes.
     Keys can not be changed once initialized.
+
+    ``Lazy`` values are computed on first access. ``derive()`` creates a
+    child Meta that only stores its overrides.
     """
 
     _values = None
+    _parent = None
+    _fingerprints = None
 
-    def __init__(self, opts=None):
+    def __init__(self, opts=None, parent=None):
+        """
+        :param opts: dict-like meta data
+        :param parent: Meta to look up keys missing from ``opts`` in
+        """
         object.__setattr__(self, "_values", {})
+        object.__setattr__(self, "_parent", parent)
+        object.__setattr__(self, "_fingerprints", {})
         if opts:
             for k, v in opts.items():
                 self._values[k] = v
@@ -54,7 +115,15 @@ class Meta(object):
         return self.get(key)
 
     def get(self, key, default=None):
-        return self._values.get(key, default)
+        meta = self
+        while meta is not None:
+            value = meta._values.get(key, _MISSING)
+            if value is not _MISSING:
+                if isinstance(value, Lazy):
+                    return value.get()
+                return value
+            meta = meta._parent
+        return default
 
     def require(self, key):
         """
@@ -65,9 +134,41 @@ class Meta(object):
             raise ValueError('"{}" is empty.'.format(key))
         return value
 
+    def keys(self):
+        if self._parent is None:
+            return list(self._values)
+        keys = self._parent.keys()
+        keys.extend(k for k in self._values if k not in keys)
+        return keys
+
     def items(self):
-        for k, v in self._values.items():
-            yield k, v
+        for k in self.keys():
+            yield k, self.get(k)
+
+    def derive(self, opts=None, **overrides):
+        """
+        Returns a child Meta with ``opts`` and ``overrides`` replacing
+        values of this Meta. This Meta is not copied.
+        """
+        if opts:
+            overrides = dict(opts.items(), **overrides)
+        return self.__class__(overrides, parent=self)
+
+    def fingerprint(self, *keys):
+        """
+        Returns a stable hex digest of the values of ``keys``, for use in
+        cache keys. Values are digested by ``repr()`` so they should be
+        plain data. The fingerprint is cached.
+        """
+        try:
+            return self._fingerprints[keys]
+        except KeyError:
+            pass
+        digest = blake2b(
+            repr([(k, self.get(k)) for k in keys]).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        self._fingerprints[keys] = digest
+        return digest
 
     def __str__(self):
         return json.dumps(dict(list(self.items())), indent=2)
@@ -76,6 +177,16 @@ class Meta(object):
         return "<{} {}>".format(self.__class__.__name__, self)
 
 
+# Traceback free summary of a Resource exit error. ``exc_type`` is first
+# so records index like ``sys.exc_info()`` tuples.
+ExitErrorRecord = namedtuple(
+    "ExitErrorRecord", ("exc_type", "message", "stack", "resource")
+)
+
+# Valid values of ``DataManager.exit_error_mode``
+EXIT_ERROR_MODES = ("exc_info", "summary")
+
+
 class DataAccessContext(object):
     """
     Lifecycle:
@@ -88,18 +199,57 @@ class DataAccessContext(object):
     - Remove from context stack
     """
 
-    def __init__(self, data_manager, meta=None):
+    # Meta key used for the timeout when none is given at creation
+    TIMEOUT_META_KEY = "timeout"
+
+    def __init__(self, data_manager, meta=None, timeout=None, parent=None):
         """
         :param data_manager: DataManager for the context
         :param meta: dict-like Read only meta data
+        :param timeout: Seconds from creation until the context deadline.
+            Defaults to the ``timeout`` Meta value. DAL calls made after
+            the deadline raise ``DeadlineExceeded``.
+        :param parent: Context this context does work for, like a hedged
+            attempt. A child context shares the admission slot and the
+            pinned registry version of its parent instead of taking its
+            own.
         """
+        if data_manager.exit_error_mode not in EXIT_ERROR_MODES:
+            raise ValueError(
+                "Unknown exit_error_mode {!r}, expected one of {}".format(
+                    data_manager.exit_error_mode, ", ".join(EXIT_ERROR_MODES)
+                )
+            )
         self.data_manager = data_manager
+        self.parent = parent
         self.dal = self.data_manager.get_dal()
         self.meta = meta if isinstance(meta, Meta) else Meta(meta)
+        if timeout is None:
+            timeout = self.meta.get(self.TIMEOUT_META_KEY)
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self._cancelled = None
         self._resources = {}
         self._resource_generators = {}
         self._middleware_generators = None
         self._resource_exit_errors = []
+        # Resource name to [bulkhead, acquired time, setup latency]
+        self._bulkheads = {}
+        # Resource name to [RecyclePolicy, created time, uses]
+        self._recycling = {}
+        self._registry = None
+        self._admission = None
+        # Stack of DalCommandRequests being handled, outermost first
+        self._requests = []
+        # Open DalStreams that keep the context alive. Weak, so a stream
+        # that is no longer used can be collected and close the context.
+        self._streams = weakref.WeakSet()
+        # (child context, future) of work running for this context on
+        # other threads, like hedged attempts
+        self._children = []
+        self._unit_of_work = None
+        # (callback, only on success, run in background)
+        self._callbacks = []
+        self._callback_errors = []
         self._state = "created"
 
     def get_resource_exit_errors(self):
@@ -109,16 +259,211 @@ class DataAccessContext(object):
         however nothing prevents them from doing so. Errors are collected
         and available here for handling/logging.
 
+        With ``DataManager.exit_error_mode = "summary"`` the errors are
+        ExitErrorRecords instead, which do not keep traceback frames and
+        their locals alive. At most ``DataManager.max_exit_errors`` errors
+        are kept per context.
+
         :returns: List of ``sys.exc_info()`` for each exception:
             [(exc_type, exc_value, traceback)]
         """
         return self._resource_exit_errors
 
+    def _record_exit_error(self, resource=None):
+        """
+        Keep the exception being handled as a Resource exit error.
+
+        :param resource: Name of the Resource that raised it
+        """
+        data_manager = self.data_manager
+        data_manager.count_resource_exit_error(resource)
+
+        max_errors = data_manager.max_exit_errors
+        if max_errors is not None and len(self._resource_exit_errors) >= max_errors:
+            return
+
+        exc_info = sys.exc_info()
+        if data_manager.exit_error_mode == "summary":
+            self._resource_exit_errors.append(
+                ExitErrorRecord(
+                    exc_info[0],
+                    str(exc_info[1]),
+                    "".join(format_exception(*exc_info)),
+                    resource,
+                )
+            )
+        else:
+            self._resource_exit_errors.append(exc_info)
+
+    def cancel(self, reason="Context cancelled"):
+        """
+        Cancel the context. May be called from any thread. DAL calls made
+        after cancelling raise ``ContextCancelled``, work already running
+        should check ``cancelled`` or call ``raise_if_cancelled()``.
+        """
+        self._cancelled = reason
+
+    def _get_cancel_reason(self):
+        """
+        Returns why the context or a running DAL call was cancelled, or
+        None.
+        """
+        if self._cancelled is not None:
+            return self._cancelled
+        for request in self._requests:
+            if request._cancelled is not None:
+                return request._cancelled
+
+    @property
+    def cancelled(self):
+        """
+        True if the context or a running DAL call was cancelled or the
+        deadline has passed.
+        """
+        return self._get_cancel_reason() is not None or (
+            self.deadline is not None and time.monotonic() >= self.deadline
+        )
+
+    def remaining(self):
+        """
+        Returns the seconds left until the deadline, ``0`` if the deadline
+        has passed or the context was cancelled, and ``None`` if there is
+        no deadline. Resources and Services can use this as the timeout
+        for backend calls.
+        """
+        if self._get_cancel_reason() is not None:
+            return 0
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self):
+        """
+        :raises: ContextCancelled if the context or a running DAL call
+            was cancelled or DeadlineExceeded if its deadline has passed.
+        """
+        reason = self._get_cancel_reason()
+        if reason is not None:
+            raise ContextCancelled(reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("Context deadline exceeded")
+
+    @property
+    def unit_of_work(self):
+        """
+        The UnitOfWork that buffers writes for this context. Created on
+        first use with ``DataManager.UnitOfWork``.
+        """
+        if self._unit_of_work is None:
+            if self._state not in ("active", "setup"):
+                raise RuntimeError("Unit of work requires an active context")
+            self._unit_of_work = self.data_manager.UnitOfWork()
+        return self._unit_of_work
+
+    def get_current_request(self):
+        """
+        Returns the DalCommandRequest of the innermost DAL call being
+        handled in this context, or None if no DAL call is running.
+        """
+        if self._requests:
+            return self._requests[-1]
+
+    def get_call_depth(self):
+        """
+        Returns the number of nested DAL calls being handled in this
+        context. ``0`` means no DAL call is running.
+        """
+        return len(self._requests)
+
+    def get_services(self):
+        """
+        Returns the mapping of Service name to Service for this context. Once
+        the context is entered, this is the registry version pinned by the
+        context so Services replaced mid-context are not seen.
+        """
+        if self._registry is not None:
+            return self._registry.services
+        return self.dal.get_services()
+
+    def on_success(self, callback, background=False):
+        """
+        Call ``callback()`` after the context exits without an exception.
+        Callbacks run after Resources are torn down, so writes have been
+        committed.
+
+        :param callback: Callable that takes no arguments
+        :param background: Run on the DataManager's background executor
+            instead of in the exiting thread
+        """
+        self._add_callback(callback, True, background)
+
+    def on_exit(self, callback, background=False):
+        """
+        Call ``callback(exception)`` after the context exits. ``exception``
+        is the exception raised out of the context or None.
+
+        :param callback: Callable that takes the exception
+        :param background: Run on the DataManager's background executor
+            instead of in the exiting thread
+        """
+        self._add_callback(callback, False, background)
+
+    def _add_callback(self, callback, success_only, background):
+        if self._state == "exited":
+            raise RuntimeError("Context has already exited")
+        self._callbacks.append((callback, success_only, background))
+
+    def get_callback_errors(self):
+        """
+        Returns a list of errors raised by ``on_success`` and ``on_exit``
+        callbacks. Errors of background callbacks are added once they
+        finish.
+
+        :returns: List of ``sys.exc_info()`` for each exception:
+            [(exc_type, exc_value, traceback)]
+        """
+        return self._callback_errors
+
+    def _run_callbacks(self, exception):
+        """
+        Run ``on_success`` and ``on_exit`` callbacks once the context
+        has exited.
+        """
+        callbacks, self._callbacks = self._callbacks, []
+        for callback, success_only, background in callbacks:
+            if success_only:
+                if exception is not None:
+                    continue
+                args = ()
+            else:
+                args = (exception,)
+
+            if background:
+                future = self.data_manager.get_callback_executor().submit(
+                    callback, *args
+                )
+                future.add_done_callback(self._background_callback_done)
+            else:
+                try:
+                    callback(*args)
+                except Exception:
+                    self._callback_errors.append(sys.exc_info())
+
+    def _background_callback_done(self, future):
+        exc = future.exception()
+        if exc is not None:
+            self._callback_errors.append((type(exc), exc, exc.__traceback__))
+
     def _setup(self):
         """
         Setup the context. Should only be called by
         __enter__'ing the context.
         """
+        if self.parent is not None:
+            # A child must see the same implementations as its parent
+            self._registry = self.parent._registry
+        else:
+            self._registry = self.data_manager.acquire_registry()
         self.data_manager.ctx_stack.push(self)
         self._setup_hook()
 
@@ -146,6 +491,12 @@ class DataAccessContext(object):
         if self._state != "created":
             raise RuntimeError("Context may only be used once")
 
+        admission = self.data_manager.admission_controller
+        if admission is not None and self.parent is None:
+            # Raises Overloaded before anything is set up
+            admission.admit(self)
+            self._admission = admission
+
         self._state = "setup"
         try:
             self._setup()
@@ -167,6 +518,13 @@ class DataAccessContext(object):
         Close all open resources, middleware and
         remove context from stack
 
+        If ``DalStream``s are still open and there is no in-context
+        exception, the context is only removed from the stack. Teardown
+        happens once the last stream is exhausted or closed.
+
+        Pending ``unit_of_work`` writes are flushed before Middleware
+        teardown, or discarded if there is an in-context exception.
+
         In-context exceptions (exceptions raised between ``__enter__``
         and ``__exit__``) are propagated to Middleware, Resources, and
         eventually raised outside the ``DataAccessContext``. Resources
@@ -185,6 +543,32 @@ class DataAccessContext(object):
         """
         if self._state not in ("active", "setup"):
             raise PolydatumException("Context must be active to exit it")
+
+        if self._streams:
+            if exc_type is None and self._state == "active":
+                # Defer teardown until the streams are done
+                self._state = "streaming"
+                self.data_manager.ctx_stack.pop()
+                return False
+
+            streams, self._streams = list(self._streams), weakref.WeakSet()
+            for stream in streams:
+                stream._abandon()
+
+        self._join_children()
+
+        unit_of_work, self._unit_of_work = self._unit_of_work, None
+        if unit_of_work is not None:
+            if exc_type is None:
+                # Flush while the context is still active so flushers can
+                # use Resources. A flush error is an in-context exception.
+                try:
+                    unit_of_work.flush()
+                except:
+                    exc_type, exc_value, traceback = sys.exc_info()
+            else:
+                unit_of_work.discard()
+
         self._state = "exiting"
 
         if exc_type is not None and exc_value is None:
@@ -213,20 +597,10 @@ class DataAccessContext(object):
         except:
             # Teardown hook exceptions are trapped and
             # stored as a resource exit error.
-            self._resource_exit_errors.append(sys.exc_info())
+            self._record_exit_error()
         finally:
-            # Tear down all the resources and don't
-            # propagate resource exceptions to other resources.
-            # Resource exit exceptions are not raised, instead they
-            # are collected and available with ``get_resource_exit_errors()``.
-            resources, self._resource_generators = self._resource_generators, None
-            while resources:
-                __, resource_generator = resources.popitem()
-
-                try:
-                    self._exit(resource_generator, exc_type, exc_value, traceback)
-                except:
-                    self._resource_exit_errors.append(sys.exc_info())
+            self._release_resources(exc_type, exc_value, traceback)
+            self._resource_generators = None
 
             try:
                 if exc_type:
@@ -243,7 +617,69 @@ class DataAccessContext(object):
                     self._final_hook(exc_value)
                 finally:
                     self.data_manager.ctx_stack.pop()
+                    if self._registry is not None and self.parent is None:
+                        self.data_manager.release_registry(self._registry)
                     self._state = "exited"
+                    if self._admission is not None:
+                        self._admission.release(self)
+                    if self._callbacks:
+                        self._run_callbacks(exc_value)
+
+    def _add_child(self, child, future):
+        """
+        Track ``child``, a context running ``future`` for this context on
+        another thread. The child is cancelled and waited for before this
+        context tears down.
+        """
+        self._children = [c for c in self._children if not c[1].done()]
+        self._children.append((child, future))
+
+    def _join_children(self):
+        children, self._children = self._children, []
+        for child, future in children:
+            if not future.done():
+                child.cancel("Parent context exited")
+        wait([future for __, future in children])
+
+    def _open_stream(self, stream):
+        self._streams.add(stream)
+
+    def _close_stream(self, stream, exc_type=None, exc_value=None, traceback=None):
+        """
+        Forget a closed stream. Closing the last stream of a context that
+        already exited tears the context down.
+        """
+        self._streams.discard(stream)
+        if not self._streams and self._state == "streaming":
+            self.data_manager.ctx_stack.push(self)
+            self._state = "active"
+            self.__exit__(exc_type, exc_value, traceback)
+
+    @contextmanager
+    def _resume(self, request=None):
+        """
+        Make the context and ``request``, the DAL call that returned a
+        stream, active on the current thread while the stream pulls from
+        its Service. Activates a context whose teardown is deferred by open
+        streams.
+        """
+        if request is not None:
+            self._requests.append(request)
+        try:
+            if self._state != "streaming":
+                yield
+                return
+
+            self.data_manager.ctx_stack.push(self)
+            self._state = "active"
+            try:
+                yield
+            finally:
+                self._state = "streaming"
+                self.data_manager.ctx_stack.pop()
+        finally:
+            if request is not None:
+                self._requests.pop()
 
     def _exit(self, obj, type, value, traceback):
         """
@@ -297,8 +733,14 @@ class DataAccessContext(object):
                     "Resources can only be created during an active context"
                 )
 
-            resource = self.data_manager.get_resource(name)
+            resource = self.data_manager.get_resource(name, registry=self._registry)
             if resource:
+                bulkhead = self.data_manager.get_resource_bulkhead(name)
+                if bulkhead is not None:
+                    # Fail fast before the Resource is created
+                    bulkhead.acquire()
+                    self._bulkheads[name] = [bulkhead, time.monotonic(), None]
+
                 # Call the resource to get a resource generator
                 self._resource_generators[name] = resource(self)
 
@@ -308,14 +750,105 @@ class DataAccessContext(object):
                 except StopIteration:
                     # Resource didn't want to setup, but did not
                     # raise an exception. Why not?
+                    self._release_bulkhead(name, True)
                     raise ResourceSetupException(
                         "Resource {} did not yield on setup.".format(resource)
                     )
+                except:
+                    self._release_bulkhead(name, True)
+                    raise
+
+                held = self._bulkheads.get(name)
+                if held is not None:
+                    held[2] = time.monotonic() - held[1]
+
+                policy = self.data_manager.get_resource_recycle_policy(name)
+                if policy is not None:
+                    self._recycling[name] = [policy, time.monotonic(), 0]
             else:
                 raise AttributeError('No resource named "{}" for context.'.format(name))
 
+        usage = self._recycling.get(name)
+        if usage is not None:
+            usage[2] += 1
         return self._resources[name]
 
+    def _release_resources(self, exc_type=None, exc_value=None, traceback=None):
+        """
+        Tear down all created Resources and don't propagate resource
+        exceptions to other resources. Resource exit exceptions are not
+        raised, instead they are collected and available with
+        ``get_resource_exit_errors()``.
+        """
+        resources, self._resource_generators = self._resource_generators, {}
+        self._recycling = {}
+        while resources:
+            name, resource_generator = resources.popitem()
+            self._release_resource(
+                name, resource_generator, exc_type, exc_value, traceback
+            )
+
+    def _release_resource(
+        self, name, generator, exc_type=None, exc_value=None, traceback=None
+    ):
+        failed = False
+        try:
+            self._exit(generator, exc_type, exc_value, traceback)
+        except:
+            failed = True
+            self._record_exit_error(name)
+        self._release_bulkhead(name, failed)
+
+    def recycle_resources(self):
+        """
+        Tear down Resources that reached the limit of their RecyclePolicy,
+        see ``DataManager.register_resource_recycling()``. They are created
+        again on next access.
+
+        The DAL calls this before each top level DAL call. It does nothing
+        while a DAL call is running, ``DalStream``s are open or the
+        ``unit_of_work`` has pending writes, since those may still use the
+        Resources.
+
+        :returns: Names of the recycled Resources
+        """
+        if (
+            not self._recycling
+            or self._state != "active"
+            or self._requests
+            or self._streams
+            or (self._unit_of_work is not None and self._unit_of_work.pending)
+        ):
+            return []
+
+        now = time.monotonic()
+        recycled = [
+            name
+            for name, (policy, created, uses) in self._recycling.items()
+            if policy.should_recycle(self._resources[name], now - created, uses)
+        ]
+        for name in recycled:
+            del self._recycling[name]
+            del self._resources[name]
+            self._release_resource(name, self._resource_generators.pop(name))
+        return recycled
+
+    def _release_bulkhead(self, name, failed):
+        """
+        Release the bulkhead held by the ``name`` Resource, if any.
+
+        The bulkhead adapts to the Resource setup latency. How long a
+        context holds a Resource depends on the work done with it, not on
+        the health of what the Resource connects to.
+        """
+        held = self._bulkheads.pop(name, None)
+        if held is not None:
+            bulkhead, acquired, latency = held
+            if latency is None:
+                # Setup failed
+                latency = time.monotonic() - acquired
+            bulkhead.release(latency, failed)
+
     def __contains__(self, name):
         """
         Returns true if the ``name`` Resource has been initialized.
@@ -1,8 +1,16 @@
+import gc
 import inspect
+import os
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import partial, update_wrapper
+from types import MappingProxyType
 from typing import Callable, Tuple
 
+from polydatum.batch import BatchContext
 from polydatum.context import DataAccessContext
 from polydatum.errors import AlreadyExistsException, InvalidMiddleware
 from polydatum.middleware import (
@@ -12,15 +20,23 @@ from polydatum.middleware import (
     dal_method_resolver_middleware,
     handle_dal_method,
 )
+from polydatum.pipeline import run_pipeline
 from polydatum.util import is_generator
 
 from .context import _ctx_stack
+from .registry import RegistryVersion
 from .resources import ResourceManager
+from .unit_of_work import UnitOfWork
 
 
 class DataAccessLayer(object):
     """
     Gives you access to a DataManager's services.
+
+    Calls made while another DAL call is running in the same context
+    (nested calls) take a shorter handler chain that only includes the
+    default middleware and middleware marked with
+    ``polydatum.middleware.nested``.
     """
 
     # default middleware classes need to be instantiated before being
@@ -33,20 +49,36 @@ class DataAccessLayer(object):
         default_middleware=(dal_method_resolver_middleware,),
         handler=handle_dal_method,
     ):
-        self._services = {}
+        # Copy on write, read only mapping. Readers never lock,
+        # writers serialize on ``self._lock``.
+        self._services = MappingProxyType({})
+        self._lock = threading.RLock()
         self._data_manager = data_manager
         self._handler = handler
+        self._nested_handler = handler
+        self._middleware = ()
         reversed_middleware = []
+        nested_middleware = []
 
         middleware = middleware or []
+        default_count = 0
         if default_middleware:
             middleware.extend(default_middleware)
-        for m in reversed(middleware):
+            default_count = len(default_middleware)
+        for i, m in enumerate(reversed(middleware)):
             if inspect.isclass(m):
                 m = m()
             if not isinstance(m, Callable):
                 raise InvalidMiddleware(f"{m} is not a valid Callable middleware")
             reversed_middleware.append(m)
+            # Default middleware (method resolution) always runs
+            if i < default_count or getattr(m, "nested", False):
+                nested_middleware.append(m)
+
+        self._middleware = tuple(reversed(reversed_middleware))
+        if data_manager is not None:
+            # Forked children reset the middleware with the DataManager
+            data_manager._dals.add(self)
 
         # Reverse middleware so that self._handler is the first middleware to call
         # and at the end of the stack is `self._handler`
@@ -54,6 +86,10 @@ class DataAccessLayer(object):
             self._handler = update_wrapper(
                 partial(m, handler=self._handler), self._handler
             )
+        for m in nested_middleware:
+            self._nested_handler = update_wrapper(
+                partial(m, handler=self._nested_handler), self._nested_handler
+            )
 
     def register_services(self, **services):
         """
@@ -63,13 +99,14 @@ class DataAccessLayer(object):
         :param **services: Keyword arguments where the key is the name
           to register the Service as and the value is the Service.
         """
-        for key, service in services.items():
-            if key in self._services:
-                raise AlreadyExistsException(
-                    "A Service for {} is already registered.".format(key)
-                )
-
-            self._init_service(key, service)
+        with self._lock:
+            for key, service in services.items():
+                if key in self._services:
+                    raise AlreadyExistsException(
+                        "A Service for {} is already registered.".format(key)
+                    )
+
+                self._init_service(key, service)
         return self
 
     def replace_service(self, key, service):
@@ -84,19 +121,53 @@ class DataAccessLayer(object):
         :param key: Name of service
         :param service: Service
         """
-        return self._init_service(key, service)
+        with self._lock:
+            return self._init_service(key, service)
 
     def _init_service(self, key, service):
         service.setup(self._data_manager)
-        self._services[key] = service
+        # Copy on write so published registry versions never change
+        services = dict(self._services)
+        services[key] = service
+        self._services = MappingProxyType(services)
         return service
 
+    def get_services(self):
+        """
+        Returns the current mapping of Service name to Service. The mapping
+        is never changed after it is returned.
+        """
+        return self._services
+
+    def after_fork(self):
+        """
+        Reset the lock and call ``after_fork()`` on the method middleware
+        that has one. Called in forked children by
+        ``DataManager.after_fork()``.
+        """
+        self._lock = threading.RLock()
+        for m in self._middleware:
+            after_fork = getattr(m, "after_fork", None)
+            if callable(after_fork):
+                after_fork()
+
     def _call(self, path: Tuple[PathSegment, ...], *args, **kwargs):
-        return self._handler(
-            request=DalCommandRequest(
-                self._data_manager.require_active_context(), path, args, kwargs
-            )
-        )
+        ctx = self._data_manager.require_active_context()
+        ctx.raise_if_cancelled()
+        request = DalCommandRequest(ctx, path, args, kwargs)
+        if ctx._requests:
+            # Nested calls skip middleware that only applies to external calls
+            handler = self._nested_handler
+        else:
+            handler = self._handler
+            if ctx._recycling:
+                # Between top level calls is a safe point to recycle Resources
+                ctx.recycle_resources()
+        ctx._requests.append(request)
+        try:
+            return handler(request=request)
+        finally:
+            ctx._requests.pop()
 
     def __getattr__(self, name: str) -> DalCommand:
         return DalCommand(self._call, path=(PathSegment(name=name),))
@@ -118,20 +189,75 @@ class DataAccessLayer(object):
         return DalCommand(self._call, path=path_segments)
 
 
+# DataManagers reset in forked children
+_data_managers = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for data_manager in list(_data_managers):
+        data_manager.after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 class DataManager(object):
     """
     Registry for Services, Resources, and other DAL objects.
     """
 
     DataAccessLayer = DataAccessLayer
+    UnitOfWork = UnitOfWork
 
-    def __init__(self, resource_manager=None):
+    # Threads for background ``on_success``/``on_exit`` context callbacks
+    callback_workers = 4
+
+    # How contexts keep Resource exit errors. "exc_info" keeps
+    # ``sys.exc_info()`` tuples, "summary" keeps traceback free
+    # ExitErrorRecords. Contexts raise ValueError for other values.
+    exit_error_mode = "exc_info"
+    # Resource exit errors kept per context, None for no limit
+    max_exit_errors = None
+
+    def __init__(
+        self, resource_manager=None, admission_controller=None, dal_middleware=None
+    ):
+        """
+        :param resource_manager: ResourceManager, defaults to a new one
+        :param admission_controller: Optional AdmissionController that limits
+            the number of concurrently active contexts
+        :param dal_middleware: Method Middleware for the DataManager's own
+            DAL, the one returned by ``dal()`` and used by Services to call
+            each other. Middleware marked ``nested`` also sees those calls.
+        """
         if not resource_manager:
             resource_manager = ResourceManager(self)
 
+        self._after_fork_callbacks = ()
+        # DALs of this DataManager, reset in forked children
+        self._dals = weakref.WeakSet()
+
         self._resource_manager = resource_manager
-        self._dal = self.DataAccessLayer(self)
-        self._middleware = []
+        self.admission_controller = admission_controller
+        if dal_middleware:
+            self._dal = self.DataAccessLayer(self, middleware=list(dal_middleware))
+        else:
+            self._dal = self.DataAccessLayer(self)
+        # Copy on write so contexts being set up never see a partial update
+        self._middleware = ()
+        self._resource_bulkheads = MappingProxyType({})
+        self._resource_recycling = MappingProxyType({})
+        self._callback_executor = None
+        self._exit_error_counts = Counter()
+        self._exit_error_lock = threading.Lock()
+
+        self._registry_lock = threading.Lock()
+        self._registry = RegistryVersion(0, {}, {})
+        # Versions that are pinned by at least one context
+        self._pinned_registries = {}
+
+        _data_managers.add(self)
 
         # TODO Make _ctx_stack only exist on the DataManager
         self.ctx_stack = _ctx_stack
@@ -146,7 +272,7 @@ class DataManager(object):
                     "Middleware {} must be a Python generator callable.".format(m)
                 )
 
-        self._middleware.extend(middleware)
+        self._middleware = self._middleware + tuple(middleware)
 
     def get_middleware(self, context):
         """
@@ -163,12 +289,88 @@ class DataManager(object):
         """
         self._resource_manager.register_resources(**resources)
 
+    def register_scoped_resources(self, scope, **resources):
+        """
+        Register Resources with the ResourceManager with a ``"context"``,
+        ``"thread"`` or ``"app"`` scope. Thread and app scoped Resources are
+        shared across contexts and torn down by ``shutdown()``.
+
+        Example::
+
+            dm.register_scoped_resources("app", http=http_session)
+        """
+        self._resource_manager.register_scoped_resources(scope, **resources)
+
+    def open_app_resources(self):
+        """
+        Startup hook that creates app scoped Resources before the first
+        context uses them.
+        """
+        self._resource_manager.open_app_resources()
+
     def replace_resource(self, key, resource):
         """
         Replace a Resources on the ResourceManager.
         """
         self._resource_manager.replace_resource(key, resource)
 
+    def register_resource_bulkheads(self, **bulkheads):
+        """
+        Limit how many contexts may use a Resource at once. The bulkhead is
+        acquired when a context creates the Resource and released after the
+        Resource is torn down. Contexts that would exceed the limit fail
+        with ``BulkheadFull``. The limit adapts to the Resource setup
+        latency, such as the time to check out a connection.
+
+        Example::
+
+            dm.register_resource_bulkheads(search=AdaptiveBulkhead(limit=20))
+
+        :param **bulkheads: Resource name to AdaptiveBulkhead
+        """
+        resource_bulkheads = dict(self._resource_bulkheads)
+        resource_bulkheads.update(bulkheads)
+        self._resource_bulkheads = MappingProxyType(resource_bulkheads)
+
+    def get_resource_bulkhead(self, name):
+        return self._resource_bulkheads.get(name)
+
+    def register_resource_recycling(self, **policies):
+        """
+        Recycle Resources inside long lived contexts. Once a Resource
+        reaches a limit of its RecyclePolicy it is torn down at the next
+        safe point, between top level DAL calls, and created again on
+        next access.
+
+        Example::
+
+            dm.register_resource_recycling(db=RecyclePolicy(max_uses=10000))
+
+        :param **policies: Resource name to RecyclePolicy
+        """
+        resource_recycling = dict(self._resource_recycling)
+        resource_recycling.update(policies)
+        self._resource_recycling = MappingProxyType(resource_recycling)
+
+    def get_resource_recycle_policy(self, name):
+        return self._resource_recycling.get(name)
+
+    def count_resource_exit_error(self, name):
+        """
+        Count a Resource exit error. ``name`` is None for errors that are
+        not raised by a Resource, like context teardown hook errors.
+        """
+        with self._exit_error_lock:
+            self._exit_error_counts[name] += 1
+
+    def get_resource_exit_error_counts(self):
+        """
+        Returns the number of exit errors per Resource name across all
+        contexts, including errors not kept because of ``max_exit_errors``.
+        """
+        with self._exit_error_lock:
+            return dict(self._exit_error_counts)
+
     def register_services(self, **services):
         """
         Register Services with the DataAccessLayer
@@ -181,15 +383,219 @@ class DataManager(object):
         """
         self._dal.replace_service(key, service)
 
-    def get_resource(self, name):
-        if name in self._resource_manager:
-            return self._resource_manager[name]
+    def get_resource(self, name, registry=None):
+        """
+        Get a Resource by name.
+
+        :param name: Name of the Resource
+        :param registry: RegistryVersion to get the Resource from. Defaults
+            to the current version.
+        """
+        if registry is None:
+            registry = self.get_registry()
+        return registry.resources.get(name)
+
+    def get_registry(self):
+        """
+        Returns the current RegistryVersion. A new version is published
+        whenever a Service or Resource is registered or replaced.
+        """
+        registry = self._registry
+        if (
+            registry.services is self._dal.get_services()
+            and registry.resources is self._resource_manager.get_resources()
+        ):
+            return registry
+
+        with self._registry_lock:
+            registry = self._registry
+            services = self._dal.get_services()
+            resources = self._resource_manager.get_resources()
+            if registry.services is not services or registry.resources is not resources:
+                registry = RegistryVersion(registry.version + 1, services, resources)
+                self._registry = registry
+            return registry
+
+    def acquire_registry(self):
+        """
+        Pin the current RegistryVersion for a context. Must be paired with
+        ``release_registry()``.
+        """
+        registry = self.get_registry()
+        with self._registry_lock:
+            registry.contexts += 1
+            self._pinned_registries[registry.version] = registry
+        return registry
+
+    def release_registry(self, registry):
+        """
+        Unpin a RegistryVersion. Once the last context using a version that
+        is no longer current exits, the version is released.
+        """
+        with self._registry_lock:
+            registry.contexts -= 1
+            if registry.contexts <= 0:
+                self._pinned_registries.pop(registry.version, None)
+
+    def get_pinned_registry_versions(self):
+        """
+        Returns the sorted version numbers pinned by active contexts.
+        """
+        with self._registry_lock:
+            return sorted(self._pinned_registries)
 
     def get_dal(self):
         return self._dal
 
-    def context(self, meta=None):
-        return DataAccessContext(self, meta=meta)
+    def get_callback_executor(self):
+        """
+        Returns the executor that runs background context callbacks.
+        """
+        if self._callback_executor is None:
+            with self._registry_lock:
+                if self._callback_executor is None:
+                    self._callback_executor = ThreadPoolExecutor(
+                        self.callback_workers,
+                        thread_name_prefix="polydatum-callback",
+                    )
+        return self._callback_executor
+
+    def shutdown(self, wait=True):
+        """
+        Release process level state held by the DataManager, such as
+        background threads and Resources kept across contexts.
+
+        :param wait: Wait for pending background work to finish
+        """
+        executor, self._callback_executor = self._callback_executor, None
+        try:
+            if executor is not None:
+                executor.shutdown(wait=wait)
+        finally:
+            self._resource_manager.shutdown()
+
+    def warmup(self, app_resources=False, freeze=True):
+        """
+        Prepare the DataManager before forking workers, such as gunicorn
+        prefork workers, so children share the prepared memory.
+
+        Publishes the registry of Services and Resources and, with
+        ``freeze``, collects garbage and moves all objects to the permanent
+        generation with ``gc.freeze()``. The garbage collector then never
+        writes to them, so their pages stay shared copy-on-write.
+
+        :param app_resources: Also create app scoped Resources. Children
+            only keep the values of ``AppResource(..., fork_safe=True)``,
+            see ``after_fork()``.
+        :param freeze: Freeze the objects that exist after warmup
+        """
+        self.get_registry()
+        if app_resources:
+            self.open_app_resources()
+        if freeze and hasattr(gc, "freeze"):
+            # Python 3.7+
+            gc.collect()
+            gc.freeze()
+
+    def register_after_fork(self, *callbacks):
+        """
+        Call ``callbacks`` in forked children, after the DataManager has
+        reset its own state. Use this for objects the DataManager does not
+        know about, like clients kept in module globals.
+
+        Example::
+
+            dm.register_after_fork(metrics_client.reconnect)
+        """
+        self._after_fork_callbacks = self._after_fork_callbacks + callbacks
+
+    def after_fork(self):
+        """
+        Reset process level state in a forked child. Called automatically
+        with ``os.register_at_fork()``.
+
+        Locks, which may have been held by other threads of the parent,
+        counts of work running in the parent, like registry versions
+        pinned by its contexts, and worker threads, which do not exist in
+        the child, are reset. ``after_fork()`` is called on
+        the admission controller, Resource bulkheads, Resources, context
+        middleware and the method middleware of this DataManager's DALs
+        that have one.
+
+        Resources like ``WorkerResource`` and ``AppResource`` drop values
+        inherited from the parent without closing them, since closing could
+        affect the parent's connections. New values are created on next
+        use. ``AppResource(..., fork_safe=True)`` values are kept.
+        """
+        self._callback_executor = None
+        self._exit_error_lock = threading.Lock()
+        self._exit_error_counts = Counter()
+        self._registry_lock = threading.Lock()
+        pinned, self._pinned_registries = self._pinned_registries, {}
+        for registry in pinned.values():
+            registry.contexts = 0
+
+        objects = [self._resource_manager, self.admission_controller]
+        objects.extend(self._resource_bulkheads.values())
+        objects.extend(self._middleware)
+        callbacks = [
+            o.after_fork for o in objects if callable(getattr(o, "after_fork", None))
+        ]
+        callbacks.extend(dal.after_fork for dal in list(self._dals))
+        callbacks.extend(self._after_fork_callbacks)
+
+        error = None
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def context(self, meta=None, timeout=None, parent=None):
+        return DataAccessContext(self, meta=meta, timeout=timeout, parent=parent)
+
+    def batch(self, meta=None, timeout=None, commit="batch", task_middleware=()):
+        """
+        Start a BatchContext that runs many small tasks with one
+        context setup. See ``polydatum.batch.BatchContext``.
+
+        :param commit: ``"task"`` or ``"batch"``
+        :param task_middleware: Generator callables run around each task
+        """
+        return BatchContext(
+            self,
+            meta=meta,
+            timeout=timeout,
+            commit=commit,
+            task_middleware=task_middleware,
+        )
+
+    def pipeline(
+        self, iterable, path, chunk_size=1000, workers=4, max_pending=None, meta=None
+    ):
+        """
+        Ingest ``iterable`` in chunks, each chunk in its own context on a
+        worker pool. See ``polydatum.pipeline.run_pipeline``.
+
+        Example::
+
+            result = dm.pipeline(rows, "items.upsert_many", chunk_size=500)
+            for error in result.errors:
+                log.error("Chunk %s failed: %s", error.index, error.exception)
+
+        :returns: PipelineResult
+        """
+        return run_pipeline(
+            self,
+            iterable,
+            path,
+            chunk_size=chunk_size,
+            workers=workers,
+            max_pending=max_pending,
+            meta=meta,
+        )
 
     def get_active_context(self):
         """
@@ -212,11 +618,11 @@ class DataManager(object):
         return context
 
     @contextmanager
-    def dal(self, meta=None):
+    def dal(self, meta=None, timeout=None):
         """
         Start a new DataAccessContext.
 
         :returns: DataAccessLayer for this DataManager
         """
-        with self.context(meta=meta):
+        with self.context(meta=meta, timeout=timeout):
             yield self._dal
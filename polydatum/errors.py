@@ -10,6 +10,20 @@ class NotFound(ServiceError):
     code = 404
 
 
+class Overloaded(ServiceError):
+    """
+    Work was refused to protect the process from overload
+    """
+
+    code = 503
+
+
+class BulkheadFull(Overloaded):
+    """
+    A bulkhead's concurrency limit has been reached
+    """
+
+
 class ErrorsOnClose(PolydatumException):
     """
     Deprecated 0.8.4 as Resources errors on exit
@@ -27,6 +41,18 @@ class ErrorsOnClose(PolydatumException):
         )
 
 
+class ContextCancelled(PolydatumException):
+    """
+    The DataAccessContext was cancelled
+    """
+
+
+class DeadlineExceeded(ContextCancelled):
+    """
+    The DataAccessContext deadline has passed
+    """
+
+
 class AlreadyExistsException(PolydatumException):
     """
     Service, middleware, or resource already exists
@@ -0,0 +1,306 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+
+from polydatum.middleware import DalCommandRequest, dal_resolver
+
+
+class LatencyTracker(object):
+    """
+    Keeps the latencies of the last ``window`` calls.
+    """
+
+    def __init__(self, window=100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percentile):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100.0))
+        return samples[index]
+
+
+class HedgeBudget(object):
+    """
+    Token bucket that caps hedges to ``ratio`` of all hedgeable calls.
+    """
+
+    def __init__(self, ratio=0.05, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class _Timers(object):
+    """
+    Runs callbacks after a delay on a single thread, so arming a hedge
+    does not need a thread per call.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._ids = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, fn):
+        """
+        Returns a handle for ``cancel()``.
+        """
+        entry = [time.monotonic() + delay, next(self._ids), fn]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="polydatum-hedge-timer", daemon=True
+                )
+                self._thread.start()
+            elif self._heap[0] is entry:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        # Dropped when it comes due
+        entry[2] = None
+
+    def _run(self):
+        thread = threading.current_thread()
+        while True:
+            with self._condition:
+                if self._thread is not thread:
+                    return
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                timeout = self._heap[0][0] - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+                fn = heapq.heappop(self._heap)[2]
+            if fn is not None:
+                try:
+                    fn()
+                except Exception:
+                    # A failed hedge must not stop the timers of other calls
+                    pass
+
+    def stop(self):
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._heap = []
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+
+
+class _Hedge(object):
+    """
+    State shared by a call and its hedge.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.primary_done = False
+        self.child = None
+        self.future = None
+
+
+class HedgingMiddleware(object):
+    """
+    Method Middleware that hedges calls to idempotent Service methods.
+
+    The call runs inline in the caller's context, so it sees the caller's
+    Resources, transaction and ``unit_of_work``. When it has not returned
+    after the ``percentile`` latency of its DAL path, a hedge is started in
+    a child DataAccessContext on a worker thread. The child gets the
+    caller's Meta, remaining time and registry version and shares the
+    caller's admission slot.
+
+    Whichever attempt finishes first wins. A hedge that finishes first
+    cancels the call (``DalCommandRequest.cancel()``), which stops once it
+    checks ``ctx.cancelled`` or makes another DAL call, and the hedge
+    result is returned. When the call finishes first its result is
+    returned right away and the hedge is cancelled and discarded. The
+    caller's context waits for hedges that are still running before it
+    tears down, so no work continues after its ``__exit__``.
+
+    Until ``min_samples`` latencies are known for a path, calls are not
+    hedged.
+
+    Example::
+
+        class UserService(Service):
+            @idempotent
+            def get(self, user_id):
+                ...
+
+        dal = DataAccessLayer(dm, middleware=[HedgingMiddleware()])
+    """
+
+    def __init__(
+        self,
+        percentile=95,
+        min_delay=0.001,
+        budget=0.05,
+        min_samples=20,
+        window=100,
+        max_workers=16,
+    ):
+        """
+        :param percentile: Latency percentile to wait for before hedging
+        :param min_delay: Never hedge sooner than this many seconds
+        :param budget: Maximum fraction of calls that may be hedged
+        :param min_samples: Latencies needed for a path before hedging
+        :param window: Latencies kept per path
+        :param max_workers: Worker threads for hedges
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_workers = max_workers
+        self.budget = HedgeBudget(budget)
+        self.hedges = 0
+        self._trackers = {}
+        self._executor = None
+        self._timers = _Timers()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.max_workers, thread_name_prefix="polydatum-hedge"
+                    )
+        return self._executor
+
+    def shutdown(self):
+        """
+        Shut down the worker threads.
+        """
+        self._timers.stop()
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def after_fork(self):
+        """
+        Reset locks and worker threads in a forked child. Called by
+        ``DataManager.after_fork()`` for the middleware of its DALs.
+        """
+        self._lock = threading.Lock()
+        self._executor = None
+        self._timers = _Timers()
+        self.budget._lock = threading.Lock()
+        for tracker in list(self._trackers.values()):
+            tracker._lock = threading.Lock()
+
+    def get_tracker(self, key):
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers.setdefault(key, LatencyTracker(self.window))
+        return tracker
+
+    def __call__(self, request: DalCommandRequest, handler: Callable):
+        method = request.dal_method or dal_resolver(request.ctx, request.path)
+        if not getattr(method, "idempotent", False):
+            return handler(request)
+
+        tracker = self.get_tracker(tuple(p.name for p in request.path))
+        self.budget.deposit()
+
+        if len(tracker) < self.min_samples:
+            start = time.monotonic()
+            result = handler(request)
+            tracker.record(time.monotonic() - start)
+            return result
+
+        delay = max(self.min_delay, tracker.percentile(self.percentile))
+        return self._hedge(request, handler, tracker, delay)
+
+    def _start_hedge(self, request, handler, hedge):
+        """
+        Start the hedge of ``request`` unless it already returned. Runs on
+        the timer thread.
+        """
+        with hedge.lock:
+            if hedge.primary_done or not self.budget.withdraw():
+                return
+            ctx = request.ctx
+            hedge.child = ctx.data_manager.context(
+                meta=ctx.meta, timeout=ctx.remaining(), parent=ctx
+            )
+            hedge.future = self._get_executor().submit(
+                self._attempt, hedge.child, request, handler
+            )
+            ctx._add_child(hedge.child, hedge.future)
+            self.hedges += 1
+
+    def _attempt(self, child, request, handler):
+        """
+        Run ``request`` in the ``child`` context on the current thread.
+        """
+        with child:
+            attempt = DalCommandRequest(
+                child, request.path, request.args, request.kwargs
+            )
+            attempt.dal_method = request.dal_method
+            child._requests.append(attempt)
+            try:
+                result = handler(attempt)
+            finally:
+                child._requests.pop()
+        request.cancel("Hedged attempt finished first")
+        return result
+
+    def _hedge(self, request, handler, tracker, delay):
+        hedge = _Hedge()
+        timer = self._timers.call_later(
+            delay, partial(self._start_hedge, request, handler, hedge)
+        )
+        start = time.monotonic()
+        try:
+            try:
+                return handler(request)
+            finally:
+                tracker.record(time.monotonic() - start)
+                self._timers.cancel(timer)
+                with hedge.lock:
+                    hedge.primary_done = True
+        except Exception:
+            # Failed, or cancelled by a hedge that finished first
+            if hedge.future is None or hedge.future.exception() is not None:
+                raise
+            return hedge.future.result()
+        finally:
+            if hedge.future is not None and not hedge.future.done():
+                # Discarded, the caller's context waits for it on exit
+                hedge.child.cancel("Hedged attempt lost")
@@ -1,7 +1,9 @@
+from collections.abc import Mapping
 from typing import Any, Callable, Dict, Optional, Tuple
 
 from polydatum.context import DataAccessContext
 from polydatum.services import Service
+from polydatum.streams import DalStream
 
 
 class PathSegment:
@@ -59,6 +61,19 @@ class DalCommandRequest:
         self.args = args
         self.kwargs = kwargs
         self.dal_method = None  # Not resolved yet
+        self._cancelled = None
+
+    def cancel(self, reason="Request cancelled"):
+        """
+        Cancel this DAL call, but not the rest of the context. May be
+        called from any thread. While the call runs, its context reports
+        ``cancelled`` and DAL calls made from it raise ``ContextCancelled``.
+        """
+        self._cancelled = reason
+
+    @property
+    def cancelled(self):
+        return self._cancelled is not None
 
 
 class DalMethodError(Exception):
@@ -144,7 +159,7 @@ def resolve(ctx: DataAccessContext, path: Tuple[PathSegment]):
     A generator that returns a list of path segments traversed
     during resolving the dal attribute and the method to call, if any.
     """
-    service_or_method = ctx.dal._services  # noqa
+    service_or_method = ctx.get_services()
     paths = list(path)
     location = []
 
@@ -159,7 +174,7 @@ def resolve(ctx: DataAccessContext, path: Tuple[PathSegment]):
             # This if condition is handling the case of the first loop here.
             # we cannot use attribute access on the dal directly because of how
             # attribute access is deferred with DalCommandRequest objects.
-            if isinstance(service_or_method, dict):
+            if isinstance(service_or_method, Mapping):
 
                 # If the code being resolved has typo'd a service name, this
                 # could be returning something that is not a service.
@@ -178,6 +193,27 @@ def resolve(ctx: DataAccessContext, path: Tuple[PathSegment]):
             yield tuple(location), None
 
 
+def nested(middleware):
+    """
+    Mark Method Middleware to also run for nested DAL calls.
+
+    A nested call is a DAL call made while another DAL call is running
+    in the same context, usually a Service calling ``self._dal``. Nested
+    calls only run marked middleware, so unmarked middleware like auth
+    or audit runs once per external call. Default middleware always runs.
+
+    Example::
+
+        @nested
+        def timing_middleware(request, handler):
+            ...
+
+    Classes can set ``nested = True`` instead.
+    """
+    getattr(middleware, "__func__", middleware).nested = True
+    return middleware
+
+
 def dal_method_resolver_middleware(request: DalCommandRequest, handler: Callable):
     """
     A Method Middleware that resolves deferred dal attribute access to
@@ -201,4 +237,8 @@ def handle_dal_method(request: DalCommandRequest):
     """
     if not request.dal_method:
         raise DalMethodError(request.path)
-    return request.dal_method(*request.args, **request.kwargs)
+    result = request.dal_method(*request.args, **request.kwargs)
+    chunk_size = getattr(request.dal_method, "stream_chunk_size", None)
+    if chunk_size:
+        return DalStream(request.ctx, result, chunk_size, request=request)
+    return result
@@ -0,0 +1,141 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+
+class ChunkError(object):
+    """
+    A chunk that failed in a pipeline.
+    """
+
+    def __init__(self, index, items, exception):
+        """
+        :param index: Position of the chunk in the stream, starting at 0
+        :param items: Items of the chunk, for retrying
+        :param exception: Exception raised by the DAL method
+        """
+        self.index = index
+        self.items = items
+        self.exception = exception
+
+    def __repr__(self):
+        return "<{} {} {!r}>".format(
+            self.__class__.__name__, self.index, self.exception
+        )
+
+
+class PipelineResult(object):
+    """
+    Summary of a pipeline run.
+    """
+
+    def __init__(self):
+        self.chunks = 0
+        self.items = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def failed_items(self):
+        return sum(len(e.items) for e in self.errors)
+
+    @property
+    def throughput(self):
+        """
+        Items processed per second.
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.items / self.elapsed
+
+    def __repr__(self):
+        return "<{} chunks={} items={} errors={} throughput={:.1f}/s>".format(
+            self.__class__.__name__,
+            self.chunks,
+            self.items,
+            len(self.errors),
+            self.throughput,
+        )
+
+
+def chunked(iterable, chunk_size):
+    """
+    Lazily group ``iterable`` into lists of up to ``chunk_size`` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_pipeline(
+    data_manager,
+    iterable,
+    path,
+    chunk_size=1000,
+    workers=4,
+    max_pending=None,
+    meta=None,
+):
+    """
+    Call the DAL method at ``path`` with each chunk of ``iterable``. Each
+    chunk runs in its own context on a worker thread.
+
+    ``iterable`` is consumed lazily. At most ``max_pending`` chunks are
+    read ahead of the workers, so memory use is bounded no matter how
+    long the stream is. A failed chunk is recorded and the pipeline
+    continues.
+
+    :param data_manager: DataManager
+    :param iterable: Items to ingest
+    :param path: Dot notation DAL path, like ``"items.upsert_many"``. The
+        method is called with a list of items.
+    :param chunk_size: Items per chunk and context
+    :param workers: Worker threads
+    :param max_pending: Chunks submitted but not finished. Defaults to
+        twice ``workers``.
+    :param meta: Meta for each chunk context
+    :returns: PipelineResult
+    """
+    if max_pending is None:
+        max_pending = workers * 2
+    max_pending = max(max_pending, 1)
+
+    result = PipelineResult()
+
+    def run_chunk(chunk):
+        with data_manager.dal(meta=meta) as dal:
+            return dal[path](chunk)
+
+    def finish(futures):
+        for future in futures:
+            index, chunk = pending.pop(future)
+            exception = future.exception()
+            if exception is not None:
+                result.errors.append(ChunkError(index, chunk, exception))
+            else:
+                result.items += len(chunk)
+
+    started = time.monotonic()
+    pending = {}
+    with ThreadPoolExecutor(workers, thread_name_prefix="polydatum-pipeline") as pool:
+        try:
+            for index, chunk in enumerate(chunked(iterable, chunk_size)):
+                if len(pending) >= max_pending:
+                    # Backpressure, wait for a worker before reading on
+                    done, __ = wait(pending, return_when=FIRST_COMPLETED)
+                    finish(done)
+                pending[pool.submit(run_chunk, chunk)] = (index, chunk)
+                result.chunks += 1
+        finally:
+            finish(list(wait(pending).done))
+
+    result.errors.sort(key=lambda e: e.index)
+    result.elapsed = time.monotonic() - started
+    return result
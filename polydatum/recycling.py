@@ -0,0 +1,47 @@
+class RecyclePolicy(object):
+    """
+    When to tear down and re-create a Resource inside a long lived
+    context. A Resource is recycled once any of the limits is reached.
+
+    Example::
+
+        dm.register_resource_recycling(
+            db=RecyclePolicy(
+                max_uses=10000,
+                max_age=300,
+                size=lambda session: len(session.identity_map),
+                max_size=50000,
+            )
+        )
+    """
+
+    def __init__(self, max_uses=None, max_age=None, size=None, max_size=None):
+        """
+        :param max_uses: Times the Resource may be accessed on the context
+        :param max_age: Seconds since the Resource was created
+        :param size: Callable that receives the Resource value and returns
+            its size, for example its memory use or cached entries
+        :param max_size: Size at which the Resource is recycled
+        """
+        if max_size is not None and size is None:
+            raise ValueError("max_size requires a size callable")
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.size = size
+        self.max_size = max_size
+
+    def should_recycle(self, value, age, uses):
+        """
+        Returns True if the Resource should be recycled.
+
+        :param value: The Resource value
+        :param age: Seconds since the Resource was created
+        :param uses: Times the Resource was accessed
+        """
+        if self.max_uses is not None and uses >= self.max_uses:
+            return True
+        if self.max_age is not None and age >= self.max_age:
+            return True
+        if self.max_size is not None and self.size(value) >= self.max_size:
+            return True
+        return False
@@ -0,0 +1,26 @@
+class RegistryVersion(object):
+    """
+    A snapshot of the Services and Resources registered with a DataManager.
+
+    A DataAccessContext pins the version that is current when it is entered
+    and uses it for its whole lifetime. Replacing a Service or Resource
+    publishes a new version that only new contexts see, so a single context
+    never mixes old and new implementations.
+    """
+
+    def __init__(self, version, services, resources):
+        """
+        :param version: Incrementing version number
+        :param services: Mapping of Service name to Service
+        :param resources: Mapping of Resource name to Resource
+        """
+        self.version = version
+        self.services = services
+        self.resources = resources
+        # Number of contexts that have this version pinned
+        self.contexts = 0
+
+    def __repr__(self):
+        return "<{} {} contexts={}>".format(
+            self.__class__.__name__, self.version, self.contexts
+        )
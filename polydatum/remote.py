@@ -0,0 +1,423 @@
+import itertools
+import marshal
+import os
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from polydatum.context import DataAccessContext
+from polydatum.errors import DeadlineExceeded, NotFound, Overloaded, ServiceError
+from polydatum.middleware import DalCommand, DalMethodError, PathSegment
+from polydatum.streams import DalStream
+
+# Frames are a 4 byte big endian length followed by a marshal payload.
+# marshal is compact and fast but only safe between trusted processes.
+_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def encode_frame(message):
+    payload = marshal.dumps(message)
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError("Message of {} bytes is too large".format(len(payload)))
+    return _HEADER.pack(len(payload)) + payload
+
+
+def recv_frame(reader):
+    """
+    Read one message from a file like ``reader``. Returns None at EOF.
+    """
+    header = reader.read(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        raise ConnectionError("Connection closed mid frame")
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError("Frame of {} bytes is too large".format(size))
+    payload = reader.read(size)
+    if len(payload) < size:
+        raise ConnectionError("Connection closed mid frame")
+    # Peers are trusted processes of the same deployment, see above
+    return marshal.loads(payload)  # nosec
+
+
+def _listen(address):
+    if isinstance(address, str):
+        return _UnixServer(address, _RequestHandler)
+    return _TCPServer(address, _RequestHandler)
+
+
+def _connect(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sock.close()
+        raise ConnectionError("Can not connect to {}: {}".format(address, e)) from e
+    return sock
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.dal_server.serve_connection(self.request)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+else:  # pragma: no cover
+    _UnixServer = None
+
+
+class DalServer(object):
+    """
+    Serves the DAL of a DataManager over a Unix socket (``address`` is a
+    path) or TCP (``address`` is a ``(host, port)`` tuple).
+
+    Each request runs in its own context with the Meta sent by the client.
+    Requests on one connection are handled concurrently by ``max_workers``
+    threads, so clients can pipeline calls. Arguments, results and Meta
+    must be plain data (None, bool, numbers, strings, bytes, lists, tuples,
+    sets and dicts). ``DalStream`` results are sent as lists.
+
+    Example::
+
+        server = DalServer(dm, "/run/app/dal.sock")
+        server.serve_forever()
+    """
+
+    def __init__(self, data_manager, address, max_workers=8):
+        self.data_manager = data_manager
+        self._server = _listen(address)
+        self._server.dal_server = self
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="polydatum-remote"
+        )
+        self._thread = None
+        self._serving = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        """
+        The bound address. Useful when listening on TCP port 0.
+        """
+        return self._server.server_address
+
+    def serve_forever(self):
+        self._serving = True
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serve on a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="polydatum-remote-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        """
+        Stop serving and close client connections.
+        """
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._executor.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def serve_connection(self, sock):
+        """
+        Read requests from ``sock`` until the client disconnects.
+        """
+        write_lock = threading.Lock()
+        reader = sock.makefile("rb")
+        with self._lock:
+            self._connections.add(sock)
+        try:
+            while True:
+                request = recv_frame(reader)
+                if request is None:
+                    return
+                self._executor.submit(self._respond, sock, write_lock, request)
+        except (ConnectionError, OSError, ValueError, EOFError, RuntimeError):
+            # Broken connection or bad data, or shut down
+            return
+        finally:
+            reader.close()
+            with self._lock:
+                self._connections.discard(sock)
+
+    def _respond(self, sock, write_lock, request):
+        request_id = request[0]
+        try:
+            frame = encode_frame((request_id, True, self.handle(*request[1:])))
+        except Exception as e:
+            frame = encode_frame((request_id, False, self.encode_error(e)))
+
+        with write_lock:
+            try:
+                sock.sendall(frame)
+            except OSError:
+                # Client is gone
+                pass
+
+    def handle(self, path, args, kwargs, meta):
+        """
+        Call the DAL method at ``path`` in a new context.
+        """
+        with self.data_manager.dal(meta=meta) as dal:
+            result = dal[path](*args, **kwargs)
+            if isinstance(result, DalStream):
+                with result:
+                    result = list(result)
+            return result
+
+    def encode_error(self, error):
+        """
+        Returns ``(type name, message, code)`` for an exception.
+        """
+        if isinstance(error, DalMethodError):
+            code = NotFound.code
+        else:
+            code = getattr(error, "code", ServiceError.code)
+        return type(error).__name__, str(error), code
+
+
+class _Connection(object):
+    """
+    One client connection. Calls are pipelined, responses are matched
+    to requests by id on a reader thread.
+    """
+
+    def __init__(self, address):
+        self._sock = _connect(address)
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count()
+        self.closed = False
+        self._reader = threading.Thread(
+            target=self._read, name="polydatum-remote-client", daemon=True
+        )
+        self._reader.start()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def call(self, path, args, kwargs, meta, timeout=None):
+        """
+        Send a call and wait up to ``timeout`` seconds for its result.
+
+        :raises: DeadlineExceeded if there was no response in time
+        """
+        request_id, future = self.send(path, args, kwargs, meta)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # A late response is dropped by the reader
+            self._pending.pop(request_id, None)
+            raise DeadlineExceeded(
+                "No response for {} after {:.3f}s".format(path, timeout)
+            )
+
+    def send(self, path, args, kwargs, meta):
+        future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            with self._write_lock:
+                if self.closed:
+                    raise ConnectionError("Connection is closed")
+                self._sock.sendall(encode_frame((request_id, path, args, kwargs, meta)))
+        except BaseException:
+            self._pending.pop(request_id, None)
+            raise
+        return request_id, future
+
+    def _read(self):
+        error = ConnectionError("Connection closed by server")
+        reader = self._sock.makefile("rb")
+        try:
+            while True:
+                response = recv_frame(reader)
+                if response is None:
+                    break
+                request_id, ok, value = response
+                future = self._pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(decode_error(*value))
+        except (ConnectionError, OSError, ValueError, EOFError) as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+        finally:
+            reader.close()
+            self.close(error)
+
+    def close(self, error=None):
+        self.closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        error = error or ConnectionError("Connection closed")
+        while True:
+            try:
+                __, future = self._pending.popitem()
+            except KeyError:
+                return
+            future.set_exception(error)
+
+
+def decode_error(name, message, code):
+    """
+    Returns the client side exception for a remote error. ``NotFound``
+    and ``Overloaded`` keep their type, every other error is raised as a
+    ``ServiceError`` with the remote ``code``.
+    """
+    if code == NotFound.code:
+        error = NotFound(message)
+    elif code == Overloaded.code:
+        error = Overloaded(message)
+    else:
+        error = ServiceError(message)
+        error.code = code
+    error.remote_type = name
+    return error
+
+
+class RemoteDataAccessLayer(object):
+    """
+    DAL whose calls run on a ``DalServer``.
+
+    Calls made while a context of ``data_manager`` is active forward the
+    ``forward_meta_keys`` values of the context Meta and the context's
+    remaining time as the ``timeout`` Meta value. Other Meta values, which
+    may be ``Lazy`` or not plain data, are not forwarded.
+    Up to ``pool_size`` connections are opened and concurrent calls are
+    pipelined over them.
+
+    Example::
+
+        remote = RemoteDataAccessLayer(
+            "/run/app/dal.sock", data_manager=dm, forward_meta_keys=("user_id",)
+        )
+
+        with dm.context(meta={"user_id": 7}):
+            report = remote.reports.build(2024)
+            report = remote["reports.build"](2024)
+    """
+
+    def __init__(
+        self,
+        address,
+        data_manager=None,
+        pool_size=2,
+        timeout=None,
+        forward_meta_keys=(),
+    ):
+        """
+        :param address: Unix socket path or ``(host, port)`` tuple
+        :param data_manager: Optional local DataManager to forward the
+            active context Meta from
+        :param pool_size: Maximum connections
+        :param timeout: Seconds to wait for a response, defaults to the
+            remaining time of the active context or no limit
+        :param forward_meta_keys: Meta keys to forward. Their values must
+            be plain data.
+        """
+        self.address = address
+        self.forward_meta_keys = tuple(forward_meta_keys)
+        self.data_manager = data_manager
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        with self._lock:
+            connections = [c for c in self._connections if not c.closed]
+            self._connections = connections
+            if len(connections) < self.pool_size and (
+                not connections or min(c.pending for c in connections)
+            ):
+                connection = _Connection(self.address)
+                connections.append(connection)
+                return connection
+            return min(connections, key=lambda c: c.pending)
+
+    def get_meta(self):
+        """
+        Returns the Meta to forward for a call.
+        """
+        ctx = self.data_manager and self.data_manager.get_active_context()
+        if ctx is None:
+            return {}
+        meta = {key: ctx.meta.get(key) for key in self.forward_meta_keys}
+        remaining = ctx.remaining()
+        if remaining is not None:
+            meta[DataAccessContext.TIMEOUT_META_KEY] = remaining
+        return meta
+
+    def call(self, path, *args, **kwargs):
+        """
+        Call the remote DAL method at dot notation ``path``.
+
+        :raises: NotFound, Overloaded or ServiceError for remote errors,
+            DeadlineExceeded if there was no response in time and
+            ConnectionError if the connection was lost
+        """
+        meta = self.get_meta()
+        timeout = self.timeout
+        if timeout is None:
+            timeout = meta.get(DataAccessContext.TIMEOUT_META_KEY)
+        return self._get_connection().call(path, args, kwargs, meta, timeout)
+
+    def _call(self, path, *args, **kwargs):
+        return self.call(".".join(p.name for p in path), *args, **kwargs)
+
+    def __getattr__(self, name):
+        return DalCommand(self._call, path=(PathSegment(name=name),))
+
+    def __getitem__(self, path):
+        paths = path.split(".")
+        paths = paths[1:] if paths[0] == "dal" else paths
+        return DalCommand(self._call, path=tuple(PathSegment(name=p) for p in paths))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
@@ -1,4 +1,11 @@
-from polydatum.errors import AlreadyExistsException
+import itertools
+import os
+import threading
+import time
+import weakref
+from types import MappingProxyType
+
+from polydatum.errors import AlreadyExistsException, ResourceSetupException
 from polydatum.util import is_generator
 
 
@@ -49,20 +56,51 @@ class ResourceManager(object):
     """
 
     def __init__(self, data_manager):
-        self._resources = {}
+        # Copy on write, read only mapping. Readers never lock,
+        # writers serialize on ``self._lock``.
+        self._resources = MappingProxyType({})
+        self._lock = threading.RLock()
         self._data_manager = data_manager
 
     def register_resources(self, **resources):
         """
         Register resources with the ResourceManager.
         """
-        for key, resource in resources.items():
-            if key in self._resources:
-                raise AlreadyExistsException(
-                    "A Service for {} is already registered.".format(key)
+        with self._lock:
+            for key, resource in resources.items():
+                if key in self._resources:
+                    raise AlreadyExistsException(
+                        "A Service for {} is already registered.".format(key)
+                    )
+
+                self._init_resource(key, resource)
+
+    def register_scoped_resources(self, scope, **resources):
+        """
+        Register resources with a scope.
+
+        :param scope: ``"context"`` to create the Resource per context,
+            ``"thread"`` per thread or ``"app"`` once
+        """
+        try:
+            wrapper = RESOURCE_SCOPES[scope]
+        except KeyError:
+            raise ValueError(
+                "scope must be one of {}, not {!r}".format(
+                    tuple(RESOURCE_SCOPES), scope
                 )
+            )
+        if wrapper is not None:
+            resources = {key: wrapper(resource) for key, resource in resources.items()}
+        self.register_resources(**resources)
 
-            self._init_resource(key, resource)
+    def open_app_resources(self):
+        """
+        Create all ``AppResource`` values now instead of on first use.
+        """
+        for resource in self._resources.values():
+            if getattr(resource, "scope", None) == "app":
+                resource.open()
 
     def replace_resource(self, key, resource):
         """
@@ -76,7 +114,8 @@ class ResourceManager(object):
         :param key: Name of resource
         :param resource: Resource
         """
-        return self._init_resource(key, resource)
+        with self._lock:
+            return self._init_resource(key, resource)
 
     def _init_resource(self, key, resource):
         if not is_generator(resource):
@@ -90,7 +129,51 @@ class ResourceManager(object):
             # Setup is deprecated as of 0.8.4
             resource.setup(self._data_manager)
 
-        self._resources[key] = resource
+        # Copy on write so published registry versions never change
+        resources = dict(self._resources)
+        resources[key] = resource
+        self._resources = MappingProxyType(resources)
+
+    def get_resources(self):
+        """
+        Returns the current mapping of Resource name to Resource. The mapping
+        is never changed after it is returned.
+        """
+        return self._resources
+
+    def shutdown(self):
+        """
+        Call ``shutdown()`` on the Resources that have one, for example to
+        close connections kept across contexts. The first error is raised
+        after all Resources are shut down.
+        """
+        error = None
+        for resource in self._resources.values():
+            shutdown = getattr(resource, "shutdown", None)
+            if callable(shutdown):
+                try:
+                    shutdown()
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+
+    def after_fork(self):
+        """
+        Call ``after_fork()`` on the Resources that have one. Called in
+        forked children by ``DataManager.after_fork()``.
+        """
+        self._lock = threading.RLock()
+        error = None
+        for resource in self._resources.values():
+            after_fork = getattr(resource, "after_fork", None)
+            if callable(after_fork):
+                try:
+                    after_fork()
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
 
     def __getitem__(self, name):
         """
@@ -113,3 +196,388 @@ class ValueResource(Resource):
 
     def __call__(self, context):
         yield self._value
+
+
+class ResourceGroup(object):
+    """
+    Opens Resources on behalf of another Resource within a context. Each
+    Resource is opened at most once per key and all opened Resources are
+    torn down together, seeing the same in-context exception.
+
+    Used by Resources that own other Resources, such as ``ReplicaRouter``
+    and ``ShardedResource``.
+    """
+
+    def __init__(self, context):
+        self._context = context
+        self._values = {}
+        self._generators = []
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def open(self, key, resource):
+        """
+        Returns the value of ``resource`` for this context, opening it the
+        first time ``key`` is requested.
+        """
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._values:
+                generator = resource(self._context)
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    raise ResourceSetupException(
+                        "Resource {} did not yield on setup.".format(resource)
+                    )
+                self._generators.append(generator)
+                self._values[key] = value
+            return self._values[key]
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        """
+        Tear down the opened Resources in reverse order. The first exit
+        error is raised after all Resources are closed.
+        """
+        error = None
+        with self._lock:
+            generators, self._generators = self._generators, []
+            self._values = {}
+        while generators:
+            try:
+                self._context._exit(generators.pop(), exc_type, exc_value, traceback)
+            except BaseException as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+
+class WorkerResource(Resource):
+    """
+    Resource that keeps its value per thread across contexts instead of
+    creating and closing it in every context. Useful for connections and
+    sessions in thread-per-worker servers.
+
+    At each context boundary the value is:
+
+    - Validated when a context first uses it. Invalid values are closed
+      and replaced.
+    - Reset when the context exits. ``reset(value, exception)`` receives
+      the in-context exception, so it can roll back on error. Values
+      whose reset fails are closed and not reused.
+
+    Values idle for longer than ``idle_timeout`` seconds are closed.
+    ``shutdown()``, called by ``DataManager.shutdown()``, closes all idle
+    values. A nested context on a thread whose value is in use gets its
+    own value.
+
+    Example::
+
+        dm.register_resources(
+            http=WorkerResource(
+                requests.Session,
+                reset=lambda session, exc: session.cookies.clear(),
+                close=lambda session: session.close(),
+            )
+        )
+    """
+
+    def __init__(self, create, validate=None, reset=None, close=None, idle_timeout=300):
+        """
+        :param create: Callable that returns a new value
+        :param validate: Optional callable that returns True if a value
+            may be reused
+        :param reset: Optional callable ``reset(value, exception)`` called
+            when a context is done with a value
+        :param close: Optional callable that closes a value
+        :param idle_timeout: Seconds a value may be idle before it is
+            closed, ``None`` to keep idle values until shutdown
+        """
+        super(WorkerResource, self).__init__()
+        self.create = create
+        self.validate = validate
+        self.reset = reset
+        self.close = close
+        self.idle_timeout = idle_timeout
+        # Thread ident to (value, idle since)
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self.created = 0
+        self.reused = 0
+
+    def _close(self, value):
+        if self.close is not None:
+            self.close(value)
+
+    def _expired(self, idle_since, now):
+        return self.idle_timeout is not None and now - idle_since > self.idle_timeout
+
+    def checkout(self):
+        """
+        Returns the idle value of the current thread or a new value.
+        """
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("WorkerResource has been shut down")
+            entry = self._idle.pop(threading.get_ident(), None)
+
+        if entry is not None:
+            value, idle_since = entry
+            if not self._expired(idle_since, time.monotonic()) and (
+                self.validate is None or self.validate(value)
+            ):
+                self.reused += 1
+                return value
+            self._close(value)
+
+        value = self.create()
+        self.created += 1
+        return value
+
+    def checkin(self, value, exception=None):
+        """
+        Reset ``value`` and keep it for the next context on this thread.
+        """
+        try:
+            if self.reset is not None:
+                self.reset(value, exception)
+        except BaseException:
+            self._close(value)
+            raise
+
+        with self._lock:
+            keep = not self._shutdown and threading.get_ident() not in self._idle
+            if keep:
+                self._idle[threading.get_ident()] = (value, time.monotonic())
+        if not keep:
+            self._close(value)
+        self.close_idle()
+
+    def close_idle(self):
+        """
+        Close values that have been idle for longer than ``idle_timeout``.
+        Values of threads that are gone are only closed this way.
+        """
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                ident
+                for ident, (__, idle_since) in self._idle.items()
+                if self._expired(idle_since, now)
+            ]
+            values = [self._idle.pop(ident)[0] for ident in expired]
+        for value in values:
+            self._close(value)
+
+    def shutdown(self):
+        """
+        Close all idle values. Values in use are closed when their
+        context exits.
+        """
+        with self._lock:
+            self._shutdown = True
+            idle, self._idle = self._idle, {}
+        for value, __ in idle.values():
+            self._close(value)
+
+    def after_fork(self):
+        """
+        Forget values inherited from the parent process without closing
+        them, they belong to the parent.
+        """
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def __call__(self, context):
+        value = self.checkout()
+        try:
+            yield value
+        except BaseException as e:
+            self.checkin(value, e)
+            raise
+        else:
+            self.checkin(value)
+
+
+class AppResource(Resource):
+    """
+    Wraps a Resource so its value is created once and shared by all
+    contexts, for expensive thread safe clients such as HTTP sessions.
+    The value is created on first use, or by
+    ``DataManager.open_app_resources()``, and torn down by
+    ``DataManager.shutdown()``.
+
+    The wrapped generator receives the context that first used it, or
+    None when opened at startup, and should not keep it. It is not
+    told about in-context exceptions.
+
+    Example::
+
+        def http(context):
+            session = requests.Session()
+            yield session
+            session.close()
+
+        dm.register_resources(http=AppResource(http))
+    """
+
+    scope = "app"
+
+    def __init__(self, resource, fork_safe=False):
+        """
+        :param resource: Resource generator callable to wrap
+        :param fork_safe: Keep the value in forked children, for values
+            without connections or threads, like compiled templates
+        """
+        super(AppResource, self).__init__()
+        self.resource = resource
+        self.fork_safe = fork_safe
+        self._values = {}
+        # Scope key to generator, in order of creation
+        self._generators = {}
+        self._lock = threading.RLock()
+
+    def get_scope_key(self):
+        """
+        Returns the key of the current scope. Values are shared within
+        a scope.
+        """
+        return None
+
+    def open(self, context=None):
+        """
+        Returns the value for the current scope, creating it if needed.
+        """
+        key = self.get_scope_key()
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._values:
+                generator = self.resource(context)
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    raise ResourceSetupException(
+                        "Resource {} did not yield on setup.".format(self.resource)
+                    )
+                self._generators[key] = generator
+                self._values[key] = value
+            return self._values[key]
+
+    def _teardown(self, generator):
+        try:
+            next(generator)
+        except StopIteration:
+            return
+        raise RuntimeError("{} yielded more than once.".format(self.resource))
+
+    def shutdown(self):
+        """
+        Tear down all values in reverse order of creation. The first error
+        is raised after all values are torn down.
+        """
+        with self._lock:
+            generators = list(self._generators.values())
+            self._generators = {}
+            self._values = {}
+        error = None
+        while generators:
+            try:
+                self._teardown(generators.pop())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def after_fork(self):
+        """
+        Forget values inherited from the parent process without tearing
+        them down, they belong to the parent. New values are created on
+        next use. ``fork_safe`` values are kept.
+        """
+        self._lock = threading.RLock()
+        if not self.fork_safe:
+            self._values = {}
+            self._generators = {}
+
+    def __call__(self, context):
+        yield self.open(context)
+
+
+class _ThreadToken(object):
+    """
+    Kept in a ``threading.local`` so it is collected when its thread ends.
+    """
+
+
+class ThreadResource(AppResource):
+    """
+    Like ``AppResource`` but creates one value per thread, for clients
+    that are expensive but not thread safe. A thread's value is torn down
+    when the thread ends, values of running threads by
+    ``DataManager.shutdown()``. Errors tearing down the value of an ended
+    thread are dropped, there is no one to raise them to.
+    """
+
+    scope = "thread"
+
+    def __init__(self, resource):
+        # The threads of the parent do not exist in forked children
+        super(ThreadResource, self).__init__(resource, fork_safe=False)
+        self._local = threading.local()
+        self._keys = itertools.count()
+
+    def get_scope_key(self):
+        try:
+            return self._local.key
+        except AttributeError:
+            pass
+        key = next(self._keys)
+        self._local.key = key
+        self._local.token = token = _ThreadToken()
+        finalizer = weakref.finalize(token, self._release, key, os.getpid())
+        # Remaining values are torn down by shutdown(), not at exit
+        finalizer.atexit = False
+        return key
+
+    def after_fork(self):
+        super(ThreadResource, self).after_fork()
+        # Thread ends in the child release the child's values
+        self._local = threading.local()
+
+    def _release(self, key, pid):
+        """
+        Tear down the value of an ended thread.
+        """
+        if pid != os.getpid():
+            # Threads of the parent are cleared in forked children, their
+            # values belong to the parent
+            return
+        with self._lock:
+            self._values.pop(key, None)
+            generator = self._generators.pop(key, None)
+        if generator is not None:
+            try:
+                self._teardown(generator)
+            except Exception:
+                pass
+
+
+# Resource wrapper for each scope name
+RESOURCE_SCOPES = {
+    "context": None,
+    "thread": ThreadResource,
+    "app": AppResource,
+}
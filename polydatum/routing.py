@@ -0,0 +1,155 @@
+import sys
+import threading
+
+from polydatum.resources import ResourceGroup
+
+
+class ReplicaRouter(object):
+    """
+    Resource that routes each use to the primary or to a read replica.
+
+    ``primary`` and each of ``replicas`` are regular Resources (generator
+    callables). The Router yields a ``RoutedResource`` that forwards
+    attribute access to the backend chosen for the current DAL call:
+
+    - The replica if the context Meta has a truthy ``read_only`` value
+    - The primary once the context has used the primary for a write, so
+      the context always reads its own writes
+    - The replica if the current DAL method is marked ``@read_only``
+    - The primary otherwise. Using the primary from a DAL method counts
+      as a write.
+
+    Backends are opened lazily, at most once per context. Each context
+    uses the replica with the least outstanding contexts.
+
+    Example::
+
+        dm.register_resources(
+            db=ReplicaRouter(primary_db, [replica_db_1, replica_db_2])
+        )
+
+        class UserService(Service):
+            @read_only
+            def get(self, user_id):
+                return self._ctx.db.query(...)  # Replica
+    """
+
+    def __init__(self, primary, replicas, meta_key="read_only"):
+        """
+        :param primary: Resource for the primary
+        :param replicas: Resources for the read replicas
+        :param meta_key: Meta key that marks a whole context read only
+        """
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.meta_key = meta_key
+        self._outstanding = [0] * len(self.replicas)
+        self._lock = threading.Lock()
+
+    def after_fork(self):
+        """
+        Reset the lock and the outstanding counts, which belong to the
+        parent, in a forked child.
+        """
+        self._lock = threading.Lock()
+        self._outstanding = [0] * len(self.replicas)
+
+    def get_outstanding(self):
+        """
+        Returns the number of contexts using each replica.
+        """
+        return list(self._outstanding)
+
+    def acquire_replica(self):
+        """
+        Returns the index of the replica with the least outstanding contexts
+        and counts the caller against it.
+        """
+        with self._lock:
+            index = min(
+                range(len(self._outstanding)), key=self._outstanding.__getitem__
+            )
+            self._outstanding[index] += 1
+            return index
+
+    def release_replica(self, index):
+        with self._lock:
+            self._outstanding[index] -= 1
+
+    def __call__(self, context):
+        routed = RoutedResource(self, context)
+        try:
+            yield routed
+        except BaseException:
+            routed.close(*sys.exc_info())
+            raise
+        else:
+            routed.close(None, None, None)
+
+
+class RoutedResource(object):
+    """
+    Per context view of a ``ReplicaRouter``. Attribute access is forwarded
+    to the backend chosen for the current DAL call. Use ``primary`` or
+    ``replica`` to choose explicitly.
+    """
+
+    def __init__(self, router, context):
+        self._router = router
+        self._context = context
+        self._group = ResourceGroup(context)
+        self._replica_index = None
+        self.wrote = False
+
+    @property
+    def primary(self):
+        return self._group.open("primary", self._router.primary)
+
+    @property
+    def replica(self):
+        if not self._router.replicas:
+            return self.primary
+        if self._replica_index is None:
+            index = self._router.acquire_replica()
+            try:
+                self._group.open("replica", self._router.replicas[index])
+            except BaseException:
+                self._router.release_replica(index)
+                raise
+            self._replica_index = index
+        return self._group.open("replica", self._router.replicas[self._replica_index])
+
+    def is_read_only(self):
+        """
+        Returns True if the current use should go to a replica.
+        """
+        if self._context.meta.get(self._router.meta_key):
+            return True
+        if self.wrote:
+            return False
+        request = self._context.get_current_request()
+        return request is not None and getattr(request.dal_method, "read_only", False)
+
+    def current(self):
+        """
+        Returns the backend for the current DAL call.
+        """
+        if self.is_read_only():
+            return self.replica
+        if self._context.get_current_request() is not None:
+            self.wrote = True
+        return self.primary
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+    def close(self, exc_type, exc_value, traceback):
+        """
+        Tear down the opened backends in reverse order.
+        """
+        try:
+            self._group.close(exc_type, exc_value, traceback)
+        finally:
+            if self._replica_index is not None:
+                self._router.release_replica(self._replica_index)
+                self._replica_index = None
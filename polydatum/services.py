@@ -1,13 +1,78 @@
+import os
+import threading
+from types import MappingProxyType
+
+# Serializes sub-service registration. Reads are lock free because
+# ``Service._services`` is a copy on write, read only mapping.
+_register_lock = threading.RLock()
+
+
+def _reset_register_lock():
+    # Another thread of the parent may have held the lock while forking
+    global _register_lock
+    _register_lock = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_register_lock)
+
+
+def idempotent(method):
+    """
+    Mark a Service method as idempotent. Idempotent methods may be
+    called more than once for a single DAL call, for example by
+    ``HedgingMiddleware``.
+    """
+    method.idempotent = True
+    return method
+
+
+def read_only(method):
+    """
+    Mark a Service method as read only. Read only methods never write
+    and can be served by read replicas, see ``ReplicaRouter``.
+    """
+    method.read_only = True
+    return method
+
+
+def streaming(method=None, chunk_size=1000):
+    """
+    Mark a Service method that returns an iterable as streaming. The DAL
+    wraps the result in a ``DalStream`` that keeps the context and its
+    Resources alive until the stream is exhausted or closed and pulls
+    ``chunk_size`` items at a time.
+
+    Example::
+
+        @streaming(chunk_size=500)
+        def export(self):
+            for row in self._ctx.db.cursor("SELECT ..."):
+                yield row
+    """
+
+    def decorate(method):
+        method.stream_chunk_size = chunk_size
+        return method
+
+    if method is not None:
+        return decorate(method)
+    return decorate
+
+
 class Service(object):
     def __init__(self):
-        self._services = {}
+        self._services = MappingProxyType({})
         self._data_manager = None
         self._dal = None
 
     def register_services(self, **services):
-        for key, service in services.items():
-            service.setup(self._data_manager)
-            self._services[key] = service
+        with _register_lock:
+            registered = dict(self._services)
+            for key, service in services.items():
+                service.setup(self._data_manager)
+                registered[key] = service
+            self._services = MappingProxyType(registered)
         return self
 
     def __getattr__(self, name):
@@ -0,0 +1,267 @@
+import inspect
+import sys
+import threading
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import blake2b
+
+from polydatum.resources import ResourceGroup
+
+
+def _hash(value):
+    return int.from_bytes(
+        blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing(object):
+    """
+    Consistent hash ring. Adding or removing a node only moves the keys
+    of that node, about ``1 / len(nodes)`` of all keys.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        """
+        :param nodes: Initial node names
+        :param vnodes: Points on the ring per node. More points spread
+            keys more evenly.
+        """
+        self.vnodes = vnodes
+        self._nodes = ()
+        self._points = ((), ())
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    def _rebuild(self, nodes):
+        points = sorted(
+            (_hash("{}#{}".format(node, i)), node)
+            for node in nodes
+            for i in range(self.vnodes)
+        )
+        # Publish hashes and nodes together so lock free readers
+        # never see them out of sync
+        self._points = (tuple(h for h, __ in points), tuple(n for __, n in points))
+        self._nodes = tuple(nodes)
+
+    def add(self, node):
+        if node not in self._nodes:
+            self._rebuild(self._nodes + (node,))
+
+    def remove(self, node):
+        self._rebuild(tuple(n for n in self._nodes if n != node))
+
+    def get(self, key):
+        """
+        Returns the node for ``key``.
+        """
+        hashes, nodes = self._points
+        if not nodes:
+            raise KeyError("Hash ring has no nodes")
+        return nodes[bisect(hashes, _hash(key)) % len(nodes)]
+
+
+class ShardedResource(object):
+    """
+    Resource that owns one Resource per shard and picks a shard by
+    consistent hashing of a shard key.
+
+    The shard key is taken from the ``meta_key`` Meta value or, if that is
+    not set, from the ``arg`` argument of the current DAL call. Shard
+    Resources are opened lazily and at most once per context.
+
+    Example::
+
+        dm.register_resources(
+            db=ShardedResource(
+                {"shard{}".format(i): make_db(i) for i in range(16)},
+                meta_key="tenant_id",
+            )
+        )
+
+        class ItemService(Service):
+            def get(self, item_id):
+                return self._ctx.db.query(...)  # Shard for meta.tenant_id
+
+            def count_all(self):
+                return self._ctx.db.scatter(lambda db: db.count(), merge=sum)
+    """
+
+    def __init__(self, shards, meta_key=None, arg=None, vnodes=64, max_workers=None):
+        """
+        :param shards: Mapping of shard name to Resource
+        :param meta_key: Meta key holding the shard key
+        :param arg: Name of the DAL method argument holding the shard key
+        :param vnodes: Points on the hash ring per shard
+        :param max_workers: Threads used by ``scatter()``, defaults to one
+            per shard, including shards added later
+        """
+        self.meta_key = meta_key
+        self.arg = arg
+        self.max_workers = max_workers
+        self._shards = dict(shards)
+        self._ring = HashRing(self._shards, vnodes=vnodes)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def shards(self):
+        return tuple(self._ring.nodes)
+
+    def add_shard(self, name, resource):
+        """
+        Add a shard. Only keys that now hash to the new shard move.
+        """
+        with self._lock:
+            shards = dict(self._shards)
+            shards[name] = resource
+            self._shards = shards
+            self._ring.add(name)
+            if self._executor is not None and self.max_workers is None:
+                # Keep one worker per shard. Running scatters finish on
+                # the old executor.
+                executor, self._executor = self._executor, None
+                executor.shutdown(wait=False)
+
+    def get_shard(self, key):
+        """
+        Returns the shard name for ``key``.
+        """
+        return self._ring.get(key)
+
+    def _submit(self, fn, shards):
+        """
+        Returns futures of ``fn(shard)`` for each shard on the worker
+        threads.
+        """
+        # Locked so add_shard() can not shut the executor down in between
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers or len(self._shards),
+                    thread_name_prefix="polydatum-scatter",
+                )
+            return [self._executor.submit(fn, shard) for shard in shards]
+
+    def shutdown(self):
+        """
+        Shut down the ``scatter()`` worker threads.
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def after_fork(self):
+        # Worker threads do not survive a fork
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __call__(self, context):
+        shards = ShardSet(self, context)
+        try:
+            yield shards
+        except BaseException:
+            shards.close(*sys.exc_info())
+            raise
+        else:
+            shards.close()
+
+
+class ShardSet(object):
+    """
+    Per context view of a ``ShardedResource``. Attribute access is
+    forwarded to the shard for the current shard key.
+    """
+
+    def __init__(self, sharded, context):
+        self._sharded = sharded
+        self._context = context
+        self._group = ResourceGroup(context)
+
+    def get_shard(self, name):
+        """
+        Returns the opened shard Resource named ``name``.
+        """
+        return self._group.open(name, self._sharded._shards[name])
+
+    def get(self, key):
+        """
+        Returns the shard Resource for ``key``.
+        """
+        return self.get_shard(self._sharded.get_shard(key))
+
+    def get_key(self):
+        """
+        Returns the shard key for the current DAL call.
+        """
+        sharded = self._sharded
+        if sharded.meta_key:
+            key = self._context.meta.get(sharded.meta_key)
+            if key is not None:
+                return key
+
+        request = self._context.get_current_request()
+        if sharded.arg and request is not None:
+            if sharded.arg in request.kwargs:
+                return request.kwargs[sharded.arg]
+            if request.dal_method is not None:
+                arguments = (
+                    inspect.signature(request.dal_method)
+                    .bind_partial(*request.args, **request.kwargs)
+                    .arguments
+                )
+                if sharded.arg in arguments:
+                    return arguments[sharded.arg]
+
+        raise LookupError("No shard key for the current call")
+
+    @property
+    def current(self):
+        return self.get(self.get_key())
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    def scatter(self, fn, keys=None, merge=None):
+        """
+        Call ``fn(shard)`` concurrently for each shard and merge the results.
+
+        ``fn`` runs on worker threads without an active context, so it
+        should only use the shard Resource it is given.
+
+        :param fn: Callable that receives a shard Resource
+        :param keys: Only use the shards for these shard keys. Defaults to
+            all shards.
+        :param merge: Callable that receives the list of results in shard
+            order. Defaults to concatenating the results.
+        :returns: Merged results
+        """
+        if keys is None:
+            names = self._sharded.shards
+        else:
+            names = []
+            for key in keys:
+                name = self._sharded.get_shard(key)
+                if name not in names:
+                    names.append(name)
+
+        # Open shards on the context's thread, Resources expect it
+        shards = [self.get_shard(name) for name in names]
+        futures = self._sharded._submit(fn, shards)
+        # Every worker must be done with its shard before an error can tear
+        # the shards down
+        wait(futures)
+        results = [f.result() for f in futures]
+
+        if merge is not None:
+            return merge(results)
+        merged = []
+        for result in results:
+            merged.extend(result)
+        return merged
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        self._group.close(exc_type, exc_value, traceback)
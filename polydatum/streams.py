@@ -0,0 +1,134 @@
+import sys
+from collections import deque
+from itertools import islice
+
+
+class DalStream(object):
+    """
+    Iterator over the result of a ``@streaming`` DAL method.
+
+    The stream keeps its DataAccessContext, including Middleware and
+    Resources, alive until it is exhausted or closed, even if the ``with``
+    block of the context has already exited. Items are pulled from the
+    Service ``chunk_size`` at a time, only when the consumer needs them,
+    so memory stays bounded.
+
+    Method Middleware can add chunk hooks with ``add_chunk_hook()``. Hooks
+    receive each chunk (a list) and return the chunk to pass on.
+
+    While a chunk is pulled, the DAL call that returned the stream is the
+    context's current request again, so the Service sees the same
+    ``get_current_request()`` and DAL calls it makes are nested calls.
+
+    Close streams, ideally with ``with``. A stream that is no longer
+    referenced is closed when it is garbage collected.
+
+    Example::
+
+        with dm.dal() as dal:
+            rows = dal.exports.rows()
+
+        with rows:
+            for row in rows:
+                write(row)
+    """
+
+    def __init__(self, ctx, iterable, chunk_size=1000, request=None):
+        """
+        :param ctx: DataAccessContext the stream belongs to
+        :param iterable: Service result to stream
+        :param chunk_size: Number of items pulled at a time
+        :param request: DalCommandRequest that returned the stream
+        """
+        self.ctx = ctx
+        self.request = request
+        self.chunk_size = chunk_size
+        self._iterator = iter(iterable)
+        self._hooks = []
+        self._buffer = deque()
+        self._closed = False
+        ctx._open_stream(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def add_chunk_hook(self, hook):
+        """
+        :param hook: Callable that receives a chunk and returns a chunk
+        """
+        self._hooks.append(hook)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._buffer:
+            if self._closed:
+                raise StopIteration
+            self._buffer.extend(self._next_chunk())
+        return self._buffer.popleft()
+
+    def chunks(self):
+        """
+        Iterate over the stream chunk by chunk.
+        """
+        if self._buffer:
+            chunk, self._buffer = list(self._buffer), deque()
+            yield chunk
+        while not self._closed:
+            chunk = self._next_chunk()
+            if chunk:
+                yield chunk
+
+    def _next_chunk(self):
+        """
+        Pull the next chunk from the Service with the context active.
+        Closes the stream when the Service is exhausted or raises.
+        """
+        try:
+            with self.ctx._resume(self.request):
+                chunk = list(islice(self._iterator, self.chunk_size))
+                for hook in self._hooks:
+                    chunk = hook(chunk)
+        except:
+            self.close(*sys.exc_info())
+            raise
+        if not chunk:
+            self.close()
+        return chunk
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        """
+        Close the stream. If the context already exited, closing its last
+        stream tears the context down. ``exc_*`` is passed to the teardown
+        as the in-context exception.
+        """
+        if self._closed:
+            return
+        self._abandon()
+        self.ctx._close_stream(self, exc_type, exc_value, traceback)
+
+    def _abandon(self):
+        """
+        Close the stream without notifying the context.
+        """
+        self._closed = True
+        self._buffer.clear()
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._closed:
+            return
+        self.close(exc_type, exc_value, traceback)
+
+    def __del__(self):
+        # Contexts only hold their streams weakly, so an abandoned stream
+        # is collected and closes its context right away
+        if not getattr(self, "_closed", True):
+            self.close()
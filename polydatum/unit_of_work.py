@@ -0,0 +1,77 @@
+class UnitOfWork(object):
+    """
+    Buffers writes for a DataAccessContext and flushes them in bulk.
+
+    Writes are registered with a ``flusher``, a callable that performs one
+    bulk operation for a list of values. Writes to the same ``key`` of the
+    same flusher are coalesced, the last write wins unless a ``merge`` is
+    given. Pending writes are flushed:
+
+    - On ``flush()``
+    - When more than ``max_pending`` writes are pending
+    - When the context exits without an exception, before Middleware and
+      Resources are torn down
+
+    Pending writes are discarded if the context exits with an exception.
+
+    Example::
+
+        def save_items(items):
+            db.bulk_upsert("items", items)
+
+        class ItemService(Service):
+            def save(self, item):
+                self._ctx.unit_of_work.register(save_items, item["id"], item)
+    """
+
+    def __init__(self, max_pending=1000):
+        """
+        :param max_pending: Pending writes that force an early flush
+        """
+        self.max_pending = max_pending
+        self._pending = {}
+        self._count = 0
+
+    @property
+    def pending(self):
+        """
+        Number of pending writes after coalescing.
+        """
+        return self._count
+
+    def register(self, flusher, key, value, merge=None):
+        """
+        Register a pending write.
+
+        :param flusher: Callable that receives a list of values to write
+        :param key: Entity key writes are coalesced by
+        :param value: Value to write
+        :param merge: Optional callable ``merge(old, new)`` used to coalesce
+            with a pending write for the same key
+        """
+        writes = self._pending.setdefault(flusher, {})
+        if key in writes:
+            if merge is not None:
+                value = merge(writes[key], value)
+        else:
+            self._count += 1
+        writes[key] = value
+
+        if self._count > self.max_pending:
+            self.flush()
+
+    def flush(self):
+        """
+        Flush all pending writes, one bulk operation per flusher in the
+        order flushers were first registered. If a flusher raises, writes
+        for the remaining flushers are discarded.
+        """
+        pending, self._pending, self._count = self._pending, {}, 0
+        for flusher, writes in pending.items():
+            flusher(list(writes.values()))
+
+    def discard(self):
+        """
+        Drop all pending writes.
+        """
+        self._pending, self._count = {}, 0
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from polydatum import DataManager
+from polydatum.admission import AdmissionController
+from polydatum.errors import Overloaded
+
+
+def _wait_for(predicate):
+    end = time.monotonic() + 2
+    while not predicate():
+        assert time.monotonic() < end, "Timed out"
+        time.sleep(0.001)
+
+
+def test_admission_limits_active_contexts():
+    """
+    Verify contexts over the limit are shed when the queue is full and
+    admitted once a slot is released.
+    """
+    admission = AdmissionController(max_active=1, max_queue=1)
+    dm = DataManager(admission_controller=admission)
+
+    admitted = []
+
+    def waiting_context():
+        with dm.context():
+            admitted.append(True)
+
+    with dm.context():
+        assert admission.stats() == {"active": 1, "queued": 0, "shed": 0}
+
+        thread = threading.Thread(target=waiting_context)
+        thread.start()
+        _wait_for(lambda: admission.queued == 1)
+
+        with pytest.raises(Overloaded):
+            with dm.context():
+                pytest.fail("Context should have been shed")
+
+        assert admission.stats() == {"active": 1, "queued": 1, "shed": 1}
+
+    thread.join()
+    assert admitted == [True]
+    assert admission.stats() == {"active": 0, "queued": 0, "shed": 1}
+
+
+def test_admission_priority_lanes():
+    """
+    Verify higher priority lanes are admitted first.
+    """
+    admission = AdmissionController(max_active=1, max_queue=10, target_delay=10)
+    dm = DataManager(admission_controller=admission)
+
+    order = []
+
+    def run(priority):
+        with dm.context(meta={"priority": priority}):
+            order.append(priority)
+
+    threads = []
+    with dm.context():
+        for priority in ("batch", "batch", "interactive"):
+            thread = threading.Thread(target=run, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            _wait_for(lambda: admission.queued == len(threads))
+
+    for thread in threads:
+        thread.join()
+
+    assert order == ["interactive", "batch", "batch"]
+
+
+def test_admission_sheds_on_queue_delay():
+    """
+    Verify that once queue time stays above target, waiting contexts
+    are shed and new contexts fail fast.
+    """
+    admission = AdmissionController(
+        max_active=1, max_queue=10, target_delay=0.001, interval=0
+    )
+    dm = DataManager(admission_controller=admission)
+
+    errors = []
+
+    def run():
+        try:
+            with dm.context():
+                time.sleep(0.01)
+        except Overloaded as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for __ in range(4)]
+    with dm.context():
+        for thread in threads:
+            thread.start()
+        _wait_for(lambda: admission.queued == 4)
+        time.sleep(0.01)
+
+    for thread in threads:
+        thread.join()
+
+    # The first waiter starts the interval, the rest are dropped
+    assert len(errors) == 3
+    assert all("queue delay" in str(e) for e in errors)
+    assert admission.shed == 3
+    assert admission.stats()["active"] == 0
+    assert not admission.dropping
+
+
+def test_admission_respects_deadline():
+    """
+    Verify a waiting context gives up at its deadline.
+    """
+    admission = AdmissionController(max_active=1, max_queue=1)
+    dm = DataManager(admission_controller=admission)
+
+    with dm.context():
+        with pytest.raises(Overloaded, match="Timed out"):
+            with dm.context(timeout=0.01):
+                pytest.fail("Context should not have been admitted")
+
+    assert admission.stats() == {"active": 0, "queued": 0, "shed": 1}
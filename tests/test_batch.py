@@ -0,0 +1,158 @@
+import pytest
+
+from polydatum import DataManager, Service
+
+
+class Database(object):
+    def __init__(self, events):
+        self.events = events
+
+    def savepoint(self):
+        self.events.append("savepoint")
+        return self
+
+    def rollback(self):
+        self.events.append("rollback savepoint")
+
+    def release(self):
+        self.events.append("release savepoint")
+
+
+class ItemService(Service):
+    def process(self, item):
+        self._ctx.db.events.append(("process", item, self._ctx.meta.item))
+        if item == "bad":
+            raise ValueError(item)
+        return item.upper()
+
+
+def _setup():
+    events = []
+
+    def db(context):
+        events.append("open")
+        try:
+            yield Database(events)
+        except Exception:
+            events.append("rollback")
+            raise
+        else:
+            events.append("commit")
+
+    def middleware(context):
+        events.append("middleware")
+        yield
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+    dm.register_resources(db=db)
+    dm.register_context_middleware(middleware)
+    return dm, events
+
+
+def savepoint(context, task):
+    savepoint = context.db.savepoint()
+    try:
+        yield
+    except Exception:
+        savepoint.rollback()
+        raise
+    else:
+        savepoint.release()
+
+
+def test_batch_commit():
+    """
+    Verify a batch sets up Middleware and Resources once, isolates failed
+    tasks and gives each task its own Meta.
+    """
+    dm, events = _setup()
+
+    with dm.batch(meta={"user": 1}, task_middleware=[savepoint]) as batch:
+        tasks = [
+            batch.run(batch.dal.items.process, item, meta={"item": item})
+            for item in ("a", "bad", "b")
+        ]
+        assert batch.meta.item is None, "Batch Meta is restored"
+        assert batch.meta.user == 1
+
+    assert [t.result for t in tasks] == ["A", None, "B"]
+    assert [t.ok for t in tasks] == [True, False, True]
+    assert isinstance(tasks[1].exception, ValueError)
+    assert tasks[0].meta.user == 1
+    assert (batch.succeeded, batch.failed) == (2, 1)
+    assert events == [
+        "middleware",
+        "open",
+        "savepoint",
+        ("process", "a", "a"),
+        "release savepoint",
+        "savepoint",
+        ("process", "bad", "bad"),
+        "rollback savepoint",
+        "savepoint",
+        ("process", "b", "b"),
+        "release savepoint",
+        "commit",
+    ]
+
+
+def test_task_commit():
+    """
+    Verify ``commit="task"`` tears down Resources and runs callbacks
+    after every task.
+    """
+    dm, events = _setup()
+
+    def process(item):
+        batch.on_exit(lambda exc: events.append(("exit", item, type(exc))))
+        return batch.dal.items.process(item)
+
+    with dm.batch(commit="task") as batch:
+        batch.on_success(lambda: events.append("batch success"))
+        batch.run(process, "a", meta={"item": "a"})
+        batch.run(process, "bad", meta={"item": "bad"})
+
+    assert events == [
+        "middleware",
+        "open",
+        ("process", "a", "a"),
+        "commit",
+        ("exit", "a", type(None)),
+        "open",
+        ("process", "bad", "bad"),
+        "rollback",
+        ("exit", "bad", ValueError),
+        "batch success",
+    ]
+
+
+def test_task_unit_of_work():
+    """
+    Verify the unit of work is flushed per successful task and discarded
+    for failed tasks.
+    """
+    dm, events = _setup()
+    flushed = []
+
+    def save(item):
+        batch.unit_of_work.register(flushed.append, item, item)
+        if item == "bad":
+            raise ValueError()
+
+    with dm.batch() as batch:
+        for item in ("a", "bad", "b"):
+            batch.run(save, item)
+
+    assert flushed == [["a"], ["b"]]
+
+
+def test_batch_requires_valid_commit():
+    dm, events = _setup()
+
+    with pytest.raises(ValueError):
+        dm.batch(commit="never")
+
+    batch = dm.batch()
+    with pytest.raises(RuntimeError):
+        batch.run(lambda: None)
@@ -0,0 +1,193 @@
+import time
+
+import pytest
+
+from polydatum import DataAccessLayer, DataManager, Service
+from polydatum.bulkheads import AdaptiveBulkhead, BulkheadMiddleware
+from polydatum.errors import BulkheadFull, NotFound
+
+
+def test_adaptive_bulkhead_aimd():
+    """
+    Verify the limit grows while latency is healthy and the limit is
+    used, and backs off on slow or failed calls.
+    """
+    bulkhead = AdaptiveBulkhead(limit=2, max_limit=4, latency_target=0.1)
+
+    bulkhead.acquire()
+    bulkhead.acquire()
+    with pytest.raises(BulkheadFull):
+        bulkhead.acquire()
+    assert bulkhead.rejected == 1
+
+    bulkhead.release(0.01)
+    bulkhead.release(0.01)
+    assert bulkhead.limit == 2, "Growth is additive"
+
+    for __ in range(10):
+        for __ in range(bulkhead.limit):
+            bulkhead.acquire()
+        for __ in range(bulkhead.limit):
+            bulkhead.release(0.01)
+    assert bulkhead.limit == 4, "Limit is capped at max_limit"
+    assert bulkhead.in_flight == 0
+
+    bulkhead.acquire()
+    bulkhead.release(1.0)
+    assert bulkhead.limit == 3
+
+    for __ in range(20):
+        bulkhead.acquire()
+        bulkhead.release(0.01, failed=True)
+    assert bulkhead.limit == 1, "Limit never drops below min_limit"
+
+
+def test_resource_bulkhead():
+    """
+    Verify a Resource bulkhead fails fast and is released when the
+    Resource is torn down.
+    """
+    bulkhead = AdaptiveBulkhead(limit=1)
+
+    def search(context):
+        yield "search"
+
+    dm = DataManager()
+    dm.register_resources(search=search, other=search)
+    dm.register_resource_bulkheads(search=bulkhead)
+
+    with dm.context() as outer:
+        assert outer.search == "search"
+        assert bulkhead.in_flight == 1
+
+        with dm.context() as inner:
+            with pytest.raises(BulkheadFull):
+                inner.search
+            assert inner.other == "search", "Other Resources are unaffected"
+
+    assert bulkhead.in_flight == 0
+
+    with dm.context() as ctx:
+        assert ctx.search == "search"
+
+
+def test_resource_bulkhead_released_on_setup_error():
+    """
+    Verify a Resource that fails setup releases its bulkhead as failed.
+    """
+    bulkhead = AdaptiveBulkhead(limit=1)
+
+    def broken(context):
+        raise ValueError()
+        yield
+
+    dm = DataManager()
+    dm.register_resources(broken=broken)
+    dm.register_resource_bulkheads(broken=bulkhead)
+
+    with pytest.raises(ValueError):
+        with dm.context() as ctx:
+            ctx.broken
+
+    assert bulkhead.in_flight == 0
+
+
+def test_resource_bulkhead_adapts_on_setup_latency():
+    """
+    Verify a Resource bulkhead adapts to the Resource setup latency and
+    not to how long a context holds the Resource.
+    """
+    bulkhead = AdaptiveBulkhead(limit=5, latency_target=0.01)
+
+    def search(context):
+        yield "search"
+
+    dm = DataManager()
+    dm.register_resources(search=search)
+    dm.register_resource_bulkheads(search=bulkhead)
+
+    with dm.context() as ctx:
+        assert ctx.search == "search"
+        time.sleep(0.05)
+
+    assert bulkhead.limit == 5, "Slow work with a fast Resource is not a backoff"
+
+    def slow_search(context):
+        time.sleep(0.05)
+        yield "search"
+
+    dm.replace_resource("search", slow_search)
+    with dm.context() as ctx:
+        assert ctx.search == "search"
+
+    assert bulkhead.limit == 4, "Slow setup backs off"
+
+
+def test_path_bulkhead_middleware():
+    """
+    Verify DAL path bulkheads match by prefix, fail fast when full and
+    ignore client errors.
+    """
+    search_bulkhead = AdaptiveBulkhead(limit=2, max_limit=2, latency_target=10)
+
+    class SearchService(Service):
+        def query(self):
+            return "results"
+
+        def missing(self):
+            raise NotFound()
+
+    class UserService(Service):
+        def get(self):
+            return "user"
+
+    dm = DataManager()
+    dm.register_services(search=SearchService(), users=UserService())
+    dal = DataAccessLayer(
+        dm, middleware=[BulkheadMiddleware({"search": search_bulkhead})]
+    )
+
+    with dm.context():
+        assert dal.search.query() == "results"
+        assert dal.users.get() == "user"
+        with pytest.raises(NotFound):
+            dal.search.missing()
+
+    assert search_bulkhead.limit == 2, "NotFound should not back off"
+    assert search_bulkhead.in_flight == 0
+
+    with dm.context():
+        search_bulkhead.acquire()
+        search_bulkhead.acquire()
+        with pytest.raises(BulkheadFull):
+            dal.search.query()
+        assert dal.users.get() == "user"
+
+
+def test_path_bulkhead_nested_calls():
+    """
+    Verify calls Services make to each other count against path bulkheads
+    when the middleware is installed on the DataManager's own DAL.
+    """
+    search_bulkhead = AdaptiveBulkhead(limit=1, max_limit=1, latency_target=10)
+    in_flight = []
+
+    class SearchService(Service):
+        def query(self):
+            in_flight.append(search_bulkhead.in_flight)
+            return "results"
+
+    class PageService(Service):
+        def render(self):
+            return self._dal.search.query()
+
+    dm = DataManager(dal_middleware=[BulkheadMiddleware({"search": search_bulkhead})])
+    dm.register_services(search=SearchService(), pages=PageService())
+
+    with dm.dal() as dal:
+        assert dal.pages.render() == "results"
+        assert in_flight == [1]
+
+        search_bulkhead.acquire()
+        with pytest.raises(BulkheadFull):
+            dal.pages.render()
@@ -0,0 +1,218 @@
+import os
+import time
+
+import pytest
+
+from polydatum import DataAccessLayer, DataManager, Service
+from polydatum.caching import (
+    CacheMiddleware,
+    DiskCache,
+    SharedMemoryCache,
+    cache_key,
+)
+
+fork_only = pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires fork")
+
+
+@pytest.fixture
+def shared(tmp_path):
+    cache = SharedMemoryCache(
+        str(tmp_path / "cache"), size=8 * 256, slot_size=256, ways=2
+    )
+    yield cache
+    cache.close()
+
+
+def test_shared_memory_cache(shared, tmp_path):
+    """
+    Verify values are shared between mappings, expire and are evicted
+    least recently used first within a bucket.
+    """
+    key = cache_key("a")
+    assert shared.get(key) is None
+    assert shared.set(key, b"value")
+    assert shared.get(key) == b"value"
+    assert not shared.set(cache_key("big"), b"x" * 256), "Larger than a slot"
+
+    with pytest.raises(ValueError):
+        SharedMemoryCache(str(tmp_path / "cache"), size=8 * 256, slot_size=256)
+
+    other = SharedMemoryCache(
+        str(tmp_path / "cache"), size=8 * 256, slot_size=256, ways=2
+    )
+    try:
+        assert other.get(key) == b"value"
+        other.set(key, b"updated")
+        assert shared.get(key) == b"updated"
+    finally:
+        other.close()
+
+    shared.set(cache_key("ttl"), b"value", ttl=0.01)
+    time.sleep(0.02)
+    assert shared.get(cache_key("ttl")) is None
+
+    shared.delete(key)
+    assert shared.get(key) is None
+
+    # Fill one bucket, the least recently used key is evicted
+    bucket = [
+        k
+        for k in (cache_key(i) for i in range(200))
+        if shared._slots(k) == shared._slots(key)
+    ]
+    first, second, third = bucket[:3]
+    shared.set(first, b"1")
+    shared.set(second, b"2")
+    shared.get(first)
+    shared.set(third, b"3")
+    assert shared.get(first) == b"1"
+    assert shared.get(second) is None
+    assert shared.get(third) == b"3"
+
+    shared.clear()
+    assert shared.get(first) is None
+
+
+@fork_only
+def test_shared_memory_cache_across_processes(shared):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            shared.set(cache_key("child"), b"from child")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert shared.get(cache_key("child")) == b"from child"
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskCache(str(tmp_path / "disk"), max_entries=2, cleanup_interval=1)
+
+    cache.set(cache_key(1), b"1")
+    cache.set(cache_key(2), b"2", ttl=0.01)
+    assert cache.get(cache_key(1)) == b"1"
+    time.sleep(0.02)
+    assert cache.get(cache_key(2)) is None
+
+    os.utime(cache._path(cache_key(1)), (1, 1))
+    cache.set(cache_key(3), b"3")
+    assert cache.get(cache_key(1)) is None, "Least recently used is removed"
+    assert cache.get(cache_key(3)) == b"3"
+
+
+def test_cache_middleware(shared, tmp_path):
+    """
+    Verify cached paths are keyed by arguments and selected Meta, and
+    hits in a later tier are copied to earlier tiers.
+    """
+    calls = []
+
+    class CatalogService(Service):
+        def get(self, item_id, locale="en"):
+            calls.append((item_id, locale))
+            return {"id": item_id, "tenant": self._ctx.meta.tenant_id}
+
+    class UserService(Service):
+        def get(self):
+            calls.append("user")
+
+    disk = DiskCache(str(tmp_path / "disk"))
+    cache = CacheMiddleware(
+        [shared, disk], paths={"catalog": 60}, meta_keys=("tenant_id",)
+    )
+    dm = DataManager()
+    dm.register_services(catalog=CatalogService(), users=UserService())
+    dal = DataAccessLayer(dm, middleware=[cache])
+
+    with dm.context(meta={"tenant_id": 1, "request_id": "a"}):
+        assert dal.catalog.get(1) == {"id": 1, "tenant": 1}
+        assert dal.catalog.get(1) == {"id": 1, "tenant": 1}
+        dal.catalog.get(1, locale="de")
+        dal.users.get()
+        dal.users.get()
+    with dm.context(meta={"tenant_id": 1, "request_id": "b"}):
+        dal.catalog.get(1)
+    with dm.context(meta={"tenant_id": 2}):
+        assert dal.catalog.get(1) == {"id": 1, "tenant": 2}
+
+    assert calls == [(1, "en"), (1, "de"), "user", "user", (1, "en")]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    shared.clear()
+    with dm.context(meta={"tenant_id": 2}):
+        assert dal.catalog.get(1) == {"id": 1, "tenant": 2}
+    assert len(calls) == 5, "Served from disk"
+
+    disk.clear()
+    with dm.context(meta={"tenant_id": 2}):
+        dal.catalog.get(1)
+    assert len(calls) == 5, "Disk hit was copied to shared memory"
+    assert cache.hits == 4
+
+
+def test_cache_nested_calls(shared):
+    """
+    Verify calls Services make to each other hit the cache when it is
+    installed on the DataManager's own DAL.
+    """
+    calls = []
+
+    class CatalogService(Service):
+        def get(self, item_id):
+            calls.append(item_id)
+            return item_id
+
+    class OrderService(Service):
+        def get(self, item_id):
+            return {"item": self._dal.catalog.get(item_id)}
+
+    cache = CacheMiddleware([shared], paths={"catalog": 60})
+    dm = DataManager(dal_middleware=[cache])
+    dm.register_services(catalog=CatalogService(), orders=OrderService())
+
+    with dm.dal() as dal:
+        assert dal.orders.get(1) == {"item": 1}
+        assert dal.orders.get(1) == {"item": 1}
+        assert dal.catalog.get(1) == 1
+
+    assert calls == [1]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cache_errors_are_misses(tmp_path):
+    """
+    Verify failing tiers and values that can no longer be unpickled never
+    fail the DAL call.
+    """
+    calls = []
+
+    class BrokenTier(object):
+        def get(self, key):
+            raise OSError("Read error")
+
+        def set(self, key, value, ttl=None):
+            raise OSError("No space left on device")
+
+    class CatalogService(Service):
+        def get(self, item_id):
+            calls.append(item_id)
+            return item_id
+
+    disk = DiskCache(str(tmp_path / "disk"))
+    cache = CacheMiddleware([BrokenTier(), disk], paths={"catalog": None})
+    dm = DataManager()
+    dm.register_services(catalog=CatalogService())
+    dal = DataAccessLayer(dm, middleware=[cache])
+
+    with dm.context():
+        assert dal.catalog.get(1) == 1
+        assert dal.catalog.get(1) == 1
+        assert calls == [1], "Served from the working tier"
+
+        # Like a value of a class renamed by a deploy
+        for entry in os.scandir(disk.directory):
+            disk.set(bytes.fromhex(entry.name), b"not a pickle")
+        assert dal.catalog.get(1) == 1
+        assert calls == [1, 1]
+
+    assert cache.errors > 0
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from polydatum import DataManager
+
+
+def _setup(events):
+    def db(context):
+        yield "db"
+        events.append("commit")
+
+    dm = DataManager()
+    dm.register_resources(db=db)
+    return dm
+
+
+def test_callbacks_run_after_teardown():
+    """
+    Verify callbacks run after Resources are torn down, in order, and
+    on_success callbacks only run on success.
+    """
+    events = []
+    dm = _setup(events)
+
+    with dm.context() as ctx:
+        ctx.db
+        ctx.on_success(lambda: events.append("invalidate cache"))
+        ctx.on_exit(lambda exc: events.append(("exit", exc)))
+
+    assert events == ["commit", "invalidate cache", ("exit", None)]
+    assert ctx.get_callback_errors() == []
+
+    events[:] = []
+    error = ValueError()
+    with pytest.raises(ValueError):
+        with dm.context() as ctx:
+            ctx.on_success(lambda: events.append("invalidate cache"))
+            ctx.on_exit(lambda exc: events.append(("exit", exc)))
+            raise error
+
+    assert events == [("exit", error)]
+
+    with pytest.raises(RuntimeError):
+        ctx.on_exit(lambda exc: None)
+
+
+def test_callback_errors_are_collected():
+    """
+    Verify callback errors do not propagate and are collected.
+    """
+    events = []
+    dm = _setup(events)
+
+    def broken():
+        raise KeyError("broken")
+
+    with dm.context() as ctx:
+        ctx.on_success(broken)
+        ctx.on_success(lambda: events.append("still runs"))
+
+    assert events == ["still runs"]
+    assert ctx.get_callback_errors()[0][0] is KeyError
+
+
+def test_background_callbacks():
+    """
+    Verify background callbacks run off the exiting thread and their
+    errors are collected.
+    """
+    events = []
+    dm = _setup(events)
+    done = threading.Event()
+
+    def notify():
+        events.append(threading.current_thread().name)
+        done.set()
+
+    def broken(exc):
+        raise KeyError("broken")
+
+    with dm.context() as ctx:
+        ctx.on_success(notify, background=True)
+        ctx.on_exit(broken, background=True)
+
+    assert done.wait(2)
+    dm.shutdown()
+
+    assert events[-1].startswith("polydatum-callback")
+    assert ctx.get_callback_errors()[0][0] is KeyError
@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from polydatum.config import (
+    Config,
+    ReloadableConfig,
+    from_env,
+    from_json_file,
+    from_module,
+    layered,
+)
+
+
+def test_config():
+    """
+    Verify Config keys are accessible and can not be changed
+    """
+    config = Config({"DEBUG": True, "NAME": "app", "lower": 1})
+
+    assert config.DEBUG is True
+    assert config.get("NAME") == "app"
+    assert config.get("MISSING", "default") == "default"
+    assert "lower" in config
+    assert config.items() == (("DEBUG", True), ("NAME", "app"))
+    assert config.items() is config.items(), "items() should be cached"
+
+    with pytest.raises(AttributeError):
+        config.MISSING
+
+    with pytest.raises(KeyError):
+        config.DEBUG = False
+
+    with pytest.raises(ValueError):
+        Config({"EMPTY": ""}).require("EMPTY")
+
+
+def test_from_module():
+    """
+    Verify only upper case module attributes are loaded
+    """
+    config = from_module("polydatum.config")
+    assert config.items() == ()
+
+    config = from_module("string")
+    assert "ascii_letters" not in config
+
+
+def test_layered_sources(tmp_path):
+    """
+    Verify later sources override earlier ones
+    """
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"NAME": "file", "PORT": 80}))
+
+    config = layered(
+        {"NAME": "default", "DEBUG": False},
+        from_json_file(str(path)),
+        from_env("APP_", environ={"APP_DEBUG": "true", "APP_NAME": "env", "X": "1"}),
+    )
+
+    assert config.items() == (("DEBUG", True), ("NAME", "env"), ("PORT", 80))
+
+
+def test_reloadable_config(tmp_path):
+    """
+    Verify a file change publishes a new snapshot and old
+    snapshots stay unchanged.
+    """
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"NAME": "first"}))
+
+    config = ReloadableConfig(lambda: from_json_file(str(path)), paths=[str(path)])
+    snapshot = config.current
+
+    assert config.NAME == "first"
+    assert config.reload_if_changed() is False
+
+    path.write_text(json.dumps({"NAME": "second!"}))
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+    assert config.reload_if_changed() is True
+    assert config.NAME == "second!"
+    assert snapshot.NAME == "first"
+
+
+def test_reload_keeps_snapshot_on_error():
+    """
+    Verify a failing loader does not replace the current snapshot
+    """
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise ValueError("Bad config")
+        return Config({"NAME": "good"})
+
+    config = ReloadableConfig(loader)
+
+    with pytest.raises(ValueError):
+        config.reload()
+
+    assert config.NAME == "good"
@@ -1,7 +1,11 @@
+import threading
+import time
+
 import pytest
 
 from polydatum import DataManager, Service
-from polydatum.context import DataAccessContext
+from polydatum.context import DataAccessContext, Lazy, Meta
+from polydatum.errors import ContextCancelled, DeadlineExceeded
 
 
 def test_meta():
@@ -76,3 +80,107 @@ def test_require_active_context():
 
     with data_manager.context() as ctx:
         assert data_manager.require_active_context() is ctx
+
+
+def test_context_deadline():
+    """
+    Verify DAL calls fail once the deadline passes and Services can read
+    the remaining time budget.
+    """
+
+    class TestService(Service):
+        def remaining(self):
+            return self._ctx.remaining()
+
+    dm = DataManager()
+    dm.register_services(test=TestService())
+
+    with dm.dal() as dal:
+        assert dal.test.remaining() is None
+
+    with dm.dal(timeout=10) as dal:
+        assert 9 < dal.test.remaining() <= 10
+
+    with dm.dal(meta={"timeout": 0.01}) as dal:
+        assert dal.test.remaining() <= 0.01
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            dal.test.remaining()
+
+
+def test_context_cancel_from_other_thread():
+    """
+    Verify a context can be cancelled from another thread and the next
+    DAL call raises ContextCancelled.
+    """
+    started = threading.Event()
+
+    class TestService(Service):
+        def wait(self):
+            started.set()
+            while not self._ctx.cancelled:
+                time.sleep(0.001)
+            return self._ctx.remaining()
+
+    dm = DataManager()
+    dm.register_services(test=TestService())
+
+    with dm.context() as ctx:
+        threading.Timer(0, lambda: started.wait() and ctx.cancel("Client left")).start()
+        assert ctx.dal.test.wait() == 0
+
+        with pytest.raises(ContextCancelled, match="Client left"):
+            ctx.dal.test.wait()
+
+
+def test_lazy_meta():
+    """
+    Verify Lazy Meta values are computed once, on first access.
+    """
+    calls = []
+
+    def load_user():
+        calls.append("load")
+        return {"id": 7}
+
+    dm = DataManager()
+    with dm.context(meta={"user_id": 7, "user": Lazy(load_user)}) as ctx:
+        assert calls == []
+        assert ctx.meta.user == {"id": 7}
+        assert ctx.meta.get("user") == {"id": 7}
+        assert ctx.meta.user_id == 7
+    assert calls == ["load"]
+
+
+def test_derive_meta():
+    """
+    Verify derived Meta overrides values of its parent without changing it.
+    """
+    parent = Meta({"user_id": 7, "locale": "en"})
+    child = parent.derive({"locale": "de"}, request_id="a")
+
+    assert child.locale == "de"
+    assert child.user_id == 7
+    assert child.request_id == "a"
+    assert parent.locale == "en"
+    assert parent.request_id is None
+    assert dict(child.items()) == {"user_id": 7, "locale": "de", "request_id": "a"}
+    assert child.get("missing", 1) == 1
+
+
+def test_meta_fingerprint():
+    """
+    Verify fingerprints only depend on the selected values.
+    """
+    meta = Meta({"tenant_id": 1, "request_id": "a"})
+
+    assert meta.fingerprint("tenant_id") == Meta({"tenant_id": 1}).fingerprint(
+        "tenant_id"
+    )
+    assert meta.fingerprint("tenant_id") == meta.derive(request_id="b").fingerprint(
+        "tenant_id"
+    )
+    assert meta.fingerprint("tenant_id") != Meta({"tenant_id": 2}).fingerprint(
+        "tenant_id"
+    )
+    assert meta.fingerprint("tenant_id") != meta.fingerprint("tenant_id", "request_id")
@@ -0,0 +1,224 @@
+import gc
+import json
+import os
+
+import pytest
+
+from polydatum import DataAccessLayer, DataManager, Service, services
+from polydatum.admission import AdmissionController
+from polydatum.bulkheads import AdaptiveBulkhead
+from polydatum.hedging import HedgingMiddleware
+from polydatum.profiling import SamplingProfiler
+from polydatum.resources import AppResource, WorkerResource
+from polydatum.routing import ReplicaRouter
+from polydatum.services import idempotent
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires fork")
+
+
+class Connection(object):
+    def __init__(self, events):
+        self.pid = os.getpid()
+        self.events = events
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.events.append(("close", self.pid))
+
+
+class PidService(Service):
+    def pids(self):
+        return {"app": self._ctx.app.pid, "worker": self._ctx.worker.pid}
+
+
+class RoutedService(Service):
+    @idempotent
+    def get(self):
+        return self._ctx.db.replica
+
+
+def _setup(events):
+    def app(context):
+        connection = Connection(events)
+        yield connection
+        connection.close()
+
+    dm = DataManager()
+    dm.register_services(pids=PidService())
+    dm.register_resources(
+        app=AppResource(app),
+        worker=WorkerResource(lambda: Connection(events), close=Connection.close),
+    )
+    return dm
+
+
+def _in_child(fn):
+    """
+    Run ``fn()`` in a forked child and return its JSON result.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            result = fn()
+            with os.fdopen(write_fd, "w") as f:
+                json.dump(result, f)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    return json.loads(data)
+
+
+def test_forked_children_get_their_own_resources():
+    """
+    Verify forked children create their own Resource values, leave the
+    parent's values alone and can run background callbacks.
+    """
+    events = []
+    dm = _setup(events)
+    parent = os.getpid()
+
+    with dm.dal() as dal:
+        assert dal.pids.pids() == {"app": parent, "worker": parent}
+        dm.get_active_context().on_success(lambda: None, background=True)
+
+    def child():
+        done = []
+        with dm.dal() as dal:
+            pids = dal.pids.pids()
+            dm.get_active_context().on_success(
+                lambda: done.append(True), background=True
+            )
+        dm.shutdown()
+        return {"pids": pids, "done": done, "events": events}
+
+    results = [_in_child(child) for __ in range(2)]
+    for result in results:
+        pid = result["pids"]["app"]
+        assert pid != parent
+        assert result["pids"] == {"app": pid, "worker": pid}
+        assert result["done"] == [True]
+        assert result["events"] == [
+            ["close", pid],
+            ["close", pid],
+        ], "Children never close values of the parent"
+    assert results[0]["pids"] != results[1]["pids"]
+
+    with dm.dal() as dal:
+        assert dal.pids.pids() == {"app": parent, "worker": parent}
+    assert events == []
+    dm.shutdown()
+    assert sorted(events) == [("close", parent), ("close", parent)]
+
+
+def test_warmup():
+    """
+    Verify warmup publishes the registry, optionally opens app Resources
+    and freezes objects for copy-on-write sharing.
+    """
+    events = []
+    dm = _setup(events)
+
+    def templates(context):
+        yield os.getpid()
+
+    dm.register_resources(templates=AppResource(templates, fork_safe=True))
+    try:
+        dm.warmup(app_resources=True)
+        assert gc.get_freeze_count() > 0
+        assert dm.get_registry().version == 1
+
+        def child():
+            with dm.dal() as dal:
+                return dict(
+                    dal.pids.pids(), templates=dm.get_active_context().templates
+                )
+
+        pids = _in_child(child)
+        assert pids["app"] == pids["worker"] != os.getpid()
+        assert pids["templates"] == os.getpid(), "Fork safe values are shared"
+    finally:
+        gc.unfreeze()
+        dm.shutdown()
+
+
+def test_after_fork_resets_locks_and_counters():
+    """
+    Verify locks held by other threads of the parent and counts of the
+    parent's running work are reset in children without registering
+    anything.
+    """
+    admission = AdmissionController(max_active=1)
+    bulkhead = AdaptiveBulkhead(limit=1)
+    dm = DataManager(admission_controller=admission)
+
+    def replica(context):
+        yield os.getpid()
+
+    router = ReplicaRouter(replica, [replica])
+    dm.register_resources(db=router)
+    dm.register_resource_bulkheads(db=bulkhead)
+    dm.register_services(pids=RoutedService())
+    hedging = HedgingMiddleware()
+    dal = DataAccessLayer(dm, middleware=[hedging])
+    sampler = SamplingProfiler()
+    sampler.start()
+
+    # Work and locks of other threads at the time of the fork
+    admission.admit(None)
+    bulkhead.acquire()
+    router.acquire_replica()
+    registry = dm.acquire_registry()
+    locks = [
+        admission._lock,
+        bulkhead._lock,
+        router._lock,
+        hedging._lock,
+        hedging.budget._lock,
+        services._register_lock,
+    ]
+    for lock in locks:
+        lock.acquire()
+    try:
+
+        def child():
+            with dm.context():
+                pid = dal.pids.get()
+            sampler.start()
+            running = sampler._thread is not None
+            sampler.stop()
+            return {
+                "pid": pid,
+                "active": admission.active,
+                "in_flight": bulkhead.in_flight,
+                "outstanding": router.get_outstanding(),
+                "sampler": running,
+                "register_lock": services._register_lock.acquire(timeout=1),
+                "pinned": dm.get_pinned_registry_versions(),
+            }
+
+        result = _in_child(child)
+    finally:
+        for lock in locks:
+            lock.release()
+        sampler.stop()
+        pinned = dm.get_pinned_registry_versions()
+        dm.release_registry(registry)
+
+    assert result["pid"] != os.getpid()
+    assert result == {
+        "pid": result["pid"],
+        "active": 0,
+        "in_flight": 0,
+        "outstanding": [0],
+        "sampler": True,
+        "register_lock": True,
+        "pinned": [],
+    }
+    assert admission.active == 1, "The parent keeps its counts"
+    assert pinned == [registry.version]
@@ -0,0 +1,254 @@
+import threading
+import time
+
+from polydatum import DataAccessLayer, DataManager, Service
+from polydatum.admission import AdmissionController
+from polydatum.hedging import HedgingMiddleware, LatencyTracker
+from polydatum.services import idempotent
+
+
+class ReplicaService(Service):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.slow_contexts = []
+        self.lock = threading.Lock()
+
+    @idempotent
+    def read(self):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call == 3:
+            # A slow backend node
+            ctx = self._ctx
+            self.slow_contexts.append(ctx)
+            end = time.monotonic() + 0.5
+            while time.monotonic() < end:
+                ctx.raise_if_cancelled()
+                time.sleep(0.001)
+            return "slow"
+        return "fast"
+
+    def write(self):
+        with self.lock:
+            self.calls += 1
+        return threading.current_thread().name
+
+
+def _setup(**kwargs):
+    service = ReplicaService()
+    dm = DataManager()
+    dm.register_services(replica=service)
+    hedging = HedgingMiddleware(min_samples=2, **kwargs)
+    dal = DataAccessLayer(dm, middleware=[hedging])
+    return dm, dal, service, hedging
+
+
+def test_hedged_read_returns_fastest_attempt():
+    """
+    Verify a slow idempotent call is hedged, the hedge result is returned
+    and the slow call is cancelled without cancelling its context.
+    """
+    dm, dal, service, hedging = _setup(budget=1.0)
+
+    with dm.context() as ctx:
+        # Two calls to learn the latency
+        assert dal.replica.read() == "fast"
+        assert dal.replica.read() == "fast"
+
+        start = time.monotonic()
+        assert dal.replica.read() == "fast"
+        assert time.monotonic() - start < 0.5
+        assert hedging.hedges == 1
+
+        # The slow call ran inline in the caller's context
+        assert service.slow_contexts == [ctx]
+        assert not ctx.cancelled
+        assert dal.replica.read() == "fast"
+
+    hedging.shutdown()
+
+
+def test_hedging_respects_budget():
+    """
+    Verify no hedges are issued without budget.
+    """
+    dm, dal, service, hedging = _setup(budget=0)
+
+    with dm.context():
+        for __ in range(2):
+            dal.replica.read()
+        assert dal.replica.read() == "slow"
+
+    assert hedging.hedges == 0
+    hedging.shutdown()
+
+
+def test_non_idempotent_methods_are_not_hedged():
+    """
+    Verify methods that are not idempotent always run inline.
+    """
+    dm, dal, service, hedging = _setup(budget=1.0)
+
+    with dm.context():
+        for __ in range(5):
+            assert dal.replica.write() == threading.current_thread().name
+
+    assert service.calls == 5
+    assert hedging.hedges == 0
+
+
+class PrimaryWinsService(Service):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.hedge_contexts = []
+        self.hedge_finished = threading.Event()
+
+    @idempotent
+    def read(self):
+        self.calls += 1
+        if self.calls == 3:
+            time.sleep(0.05)
+        elif self.calls == 4:
+            # The hedge is slower than the call it hedges
+            ctx = self._ctx
+            self.hedge_contexts.append(ctx)
+            end = time.monotonic() + 1
+            while not ctx.cancelled and time.monotonic() < end:
+                time.sleep(0.001)
+            time.sleep(0.01)
+            self.hedge_finished.set()
+        return self._ctx.db
+
+
+def test_hedge_uses_child_context_and_stops_before_return():
+    """
+    Verify the hedged call uses the caller's Resources, the hedge's child
+    context takes no admission slot and the losing hedge has stopped when
+    the caller's context exits.
+    """
+    service = PrimaryWinsService()
+    dm = DataManager(admission_controller=AdmissionController(max_active=1))
+    dm.register_services(replica=service)
+
+    def db(context):
+        yield object()
+
+    dm.register_resources(db=db)
+    hedging = HedgingMiddleware(min_samples=2, budget=1.0)
+    dal = DataAccessLayer(dm, middleware=[hedging])
+
+    with dm.context() as ctx:
+        for __ in range(2):
+            dal.replica.read()
+        assert dal.replica.read() is ctx.db
+        assert hedging.hedges == 1
+
+    assert service.hedge_finished.is_set()
+    hedge_context = service.hedge_contexts[0]
+    assert hedge_context.parent is ctx
+    assert hedge_context.cancelled
+    assert dm.admission_controller.active == 0
+    hedging.shutdown()
+
+
+class BlockingService(Service):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.finished = []
+        self.lock = threading.Lock()
+
+    @idempotent
+    def read(self):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call == 3:
+            # A backend call that never checks for cancellation
+            time.sleep(0.3)
+        elif call == 4:
+            # Its hedge is even slower
+            time.sleep(0.6)
+        self.finished.append(call)
+        return call
+
+
+def test_losing_hedge_is_not_waited_for():
+    """
+    Verify a call that wins returns without waiting for its hedge when
+    neither polls for cancellation, and the caller's context waits for
+    the hedge on exit.
+    """
+    service = BlockingService()
+    dm = DataManager()
+    dm.register_services(replica=service)
+    hedging = HedgingMiddleware(min_samples=2, budget=1.0)
+    dal = DataAccessLayer(dm, middleware=[hedging])
+
+    with dm.context():
+        for __ in range(2):
+            dal.replica.read()
+
+        start = time.monotonic()
+        assert dal.replica.read() == 3
+        assert time.monotonic() - start < 0.55
+        assert hedging.hedges == 1
+        assert 4 not in service.finished, "The hedge is still running"
+
+    assert service.finished == [1, 2, 3, 4]
+    hedging.shutdown()
+
+
+class VersionedService(Service):
+    def __init__(self, version, calls):
+        super().__init__()
+        self.version = version
+        self.calls = calls
+
+    @idempotent
+    def read(self):
+        self.calls.append(self.version)
+        if len(self.calls) == 3:
+            ctx = self._ctx
+            end = time.monotonic() + 1
+            while time.monotonic() < end:
+                ctx.raise_if_cancelled()
+                time.sleep(0.001)
+        return self.version
+
+
+def test_hedge_uses_registry_version_of_caller():
+    """
+    Verify a hedge started after a Service was replaced still uses the
+    implementation pinned by the caller's context.
+    """
+    calls = []
+    dm = DataManager()
+    dm.register_services(replica=VersionedService("old", calls))
+    hedging = HedgingMiddleware(min_samples=2, budget=1.0)
+    dal = DataAccessLayer(dm, middleware=[hedging])
+
+    with dm.context():
+        for __ in range(2):
+            dal.replica.read()
+
+        dm.replace_service("replica", VersionedService("new", calls))
+        assert dal.replica.read() == "old"
+        assert hedging.hedges == 1
+
+    assert calls == ["old", "old", "old", "old"]
+    assert dm.get_pinned_registry_versions() == []
+    hedging.shutdown()
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=10)
+    assert tracker.percentile(50) is None
+    for i in range(20):
+        tracker.record(i)
+    assert len(tracker) == 10
+    assert tracker.percentile(50) == 15
+    assert tracker.percentile(100) == 19
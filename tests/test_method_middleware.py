@@ -9,6 +9,7 @@ from polydatum.middleware import (
     DalMethodError,
     dal_resolver,
     handle_dal_method,
+    nested,
 )
 
 
@@ -269,3 +270,51 @@ def test_resolve_empty_path():
             # verify that even with a service, we aren't
             # accidentally verifying some edge case on the DAL
             dal_resolver(ctx, ())
+
+
+def test_nested_calls_skip_outer_middleware():
+    """
+    Verify nested DAL calls only run middleware marked as nested, while
+    the call stack still records them.
+    """
+    calls = []
+
+    def auth_middleware(request, handler):
+        calls.append(("auth", str(DalCommand(None, request.path))))
+        return handler(request)
+
+    @nested
+    def trace_middleware(request, handler):
+        calls.append(
+            ("trace", str(DalCommand(None, request.path)), request.ctx.get_call_depth())
+        )
+        return handler(request)
+
+    class UserService(Service):
+        def get(self):
+            return "user"
+
+    class OrderService(Service):
+        def get(self):
+            return self._dal.users.get()
+
+    class TracedDataAccessLayer(DataAccessLayer):
+        def __init__(self, data_manager):
+            super().__init__(
+                data_manager, middleware=[auth_middleware, trace_middleware]
+            )
+
+    class TracedDataManager(DataManager):
+        DataAccessLayer = TracedDataAccessLayer
+
+    dm = TracedDataManager()
+    dm.register_services(users=UserService(), orders=OrderService())
+
+    with dm.dal() as dal:
+        assert dal.orders.get() == "user"
+
+    assert calls == [
+        ("auth", "orders.get"),
+        ("trace", "orders.get", 1),
+        ("trace", "users.get", 2),
+    ]
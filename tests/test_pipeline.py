@@ -0,0 +1,86 @@
+import threading
+
+from polydatum import DataManager, Service
+from polydatum.pipeline import chunked
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+def test_pipeline():
+    """
+    Verify a pipeline runs each chunk in its own context and reports
+    failed chunks without stopping.
+    """
+    saved = []
+    contexts = []
+
+    class ItemService(Service):
+        def upsert_many(self, items):
+            if 13 in items:
+                raise ValueError("bad item")
+            saved.extend(items)
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+
+    def middleware(context):
+        contexts.append(context)
+        yield
+
+    dm.register_context_middleware(middleware)
+
+    result = dm.pipeline(iter(range(100)), "items.upsert_many", chunk_size=10)
+
+    assert result.chunks == 10
+    assert result.items == 90
+    assert sorted(saved) == [i for i in range(100) if not 10 <= i < 20]
+    assert len(contexts) == 10
+    assert len(result.errors) == 1
+    assert result.errors[0].index == 1
+    assert result.errors[0].items == list(range(10, 20))
+    assert isinstance(result.errors[0].exception, ValueError)
+    assert result.failed_items == 10
+    assert result.throughput > 0
+
+
+def test_pipeline_backpressure():
+    """
+    Verify the pipeline does not read more than ``max_pending`` chunks
+    ahead of the workers.
+    """
+    release = threading.Event()
+    read = []
+
+    def items():
+        for i in range(20):
+            read.append(i)
+            yield i
+
+    class ItemService(Service):
+        def upsert_many(self, items):
+            release.wait(5)
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+
+    thread = threading.Thread(
+        target=dm.pipeline,
+        args=(items(), "items.upsert_many"),
+        kwargs={"chunk_size": 2, "workers": 1, "max_pending": 2},
+    )
+    thread.start()
+    try:
+        # Two pending chunks plus the chunk waiting to be submitted
+        for __ in range(100):
+            if len(read) >= 6:
+                break
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.05)
+        assert len(read) == 6
+    finally:
+        release.set()
+        thread.join()
+    assert len(read) == 20
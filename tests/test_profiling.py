@@ -0,0 +1,177 @@
+import json
+import os
+import pstats
+import threading
+import time
+
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.profiling import ContextProfiler, SamplingProfiler
+
+
+class SlowService(Service):
+    def work(self):
+        return sum(i * i for i in range(20000))
+
+    def run(self):
+        return self._dal.slow.work()
+
+
+def _setup(tmp_path, **kwargs):
+    profiler = ContextProfiler(str(tmp_path), **kwargs)
+    dm = DataManager(dal_middleware=[profiler.record_path])
+    dm.register_services(slow=SlowService())
+    dm.register_context_middleware(profiler)
+    return dm, dm.get_dal()
+
+
+def test_profile_requested_by_meta(tmp_path):
+    """
+    Verify a context with the profile Meta key is profiled and annotated
+    with the DAL paths it invoked, including nested calls.
+    """
+    dm, dal = _setup(tmp_path)
+
+    with dm.context():
+        dal.slow.work()
+
+    assert os.listdir(str(tmp_path)) == [], "Only requested contexts are profiled"
+
+    with dm.context(meta={"profile": True}):
+        dal.slow.work()
+        dal["slow.work"]()
+
+    files = sorted(os.listdir(str(tmp_path)))
+    assert [os.path.splitext(f)[1] for f in files] == [
+        ".collapsed",
+        ".json",
+        ".pstats",
+    ]
+
+    base = os.path.join(str(tmp_path), os.path.splitext(files[0])[0])
+    with open(base + ".json") as f:
+        annotations = json.load(f)
+    assert annotations["paths"] == ["slow.work", "slow.work"]
+
+    with dm.context(meta={"profile": True}):
+        dal.slow.run()
+
+    (name,) = {os.path.splitext(f)[0] for f in os.listdir(str(tmp_path))} - {
+        os.path.splitext(f)[0] for f in files
+    }
+    with open(os.path.join(str(tmp_path), name + ".json")) as f:
+        annotations = json.load(f)
+    assert annotations["paths"] == ["slow.run", "slow.work"], "Nested calls too"
+
+    stats = pstats.Stats(base + ".pstats")
+    assert any(func[2] == "work" for func in stats.stats)
+
+    with open(base + ".collapsed") as f:
+        stacks = f.read()
+    assert "work_(test_profiling.py" in stacks
+
+
+def test_profile_sampling_rule_and_cap(tmp_path):
+    """
+    Verify the sampling rule selects contexts and captures are capped
+    per minute.
+    """
+    dm, dal = _setup(
+        tmp_path,
+        rule=lambda context: context.meta.user == "slow-user",
+        max_per_minute=2,
+    )
+
+    for __ in range(5):
+        with dm.context(meta={"user": "slow-user"}):
+            dal.slow.work()
+
+    with dm.context(meta={"user": "other"}):
+        dal.slow.work()
+
+    assert len(os.listdir(str(tmp_path))) == 6, "Two captures of three files"
+
+
+def test_profile_write_errors_are_dropped(tmp_path):
+    """
+    Verify a profile that can not be written does not fail the context or
+    replace its exception.
+    """
+    directory = tmp_path / "profiles"
+    directory.write_text("Not a directory")
+    dm, dal = _setup(directory)
+    profiler = dm.get_middleware(None)[0]
+
+    with dm.context(meta={"profile": True}):
+        dal.slow.work()
+
+    with pytest.raises(KeyError):
+        with dm.context(meta={"profile": True}):
+            raise KeyError()
+
+    assert profiler.write_errors == 2
+
+
+def test_sampling_profiler_attributes_dal_paths():
+    """
+    Verify the sampler attributes samples to nested DAL paths and
+    resource setup.
+    """
+
+    class OuterService(Service):
+        def run(self):
+            return self._dal.slow.spin()
+
+    class SpinService(Service):
+        def spin(self):
+            end = time.monotonic() + 0.3
+            while time.monotonic() < end:
+                pass
+
+    def slow_resource(context):
+        end = time.monotonic() + 0.3
+        while time.monotonic() < end:
+            pass
+        yield True
+
+    dm = DataManager()
+    dm.register_services(outer=OuterService(), slow=SpinService())
+    dm.register_resources(slow=slow_resource)
+
+    def work():
+        with dm.dal() as dal:
+            dal.outer.run()
+            assert dm.require_active_context().slow
+
+    sampler = SamplingProfiler(interval=0.005, max_entries=10)
+    sampler.start()
+    try:
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    finally:
+        sampler.stop()
+
+    rows = {(row["path"], row["phase"]): row for row in sampler.dump()}
+    assert ("outer.run;slow.spin", "call") in rows
+    assert ("", "resource:slow") in rows
+    assert abs(sum(row["ratio"] for row in rows.values()) - 1) < 0.0001
+
+    sampler.reset()
+    assert sampler.dump() == []
+
+
+def test_sampling_profiler_is_bounded():
+    """
+    Verify new keys are counted as other once the table is full.
+    """
+    sampler = SamplingProfiler(max_entries=2)
+    for i in range(5):
+        sampler._record(("path{}".format(i), "call"))
+
+    assert [row["path"] for row in sampler.dump()] == [
+        SamplingProfiler.OTHER,
+        "path0",
+        "path1",
+    ]
@@ -0,0 +1,90 @@
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.recycling import RecyclePolicy
+
+
+class Session(object):
+    def __init__(self, number):
+        self.number = number
+        self.cache = []
+
+
+class ItemService(Service):
+    def get(self):
+        session = self._ctx.db
+        session.cache.append(1)
+        return session.number
+
+    def get_twice(self):
+        # Nested calls are not a safe point
+        return [self._dal.items.get(), self._dal.items.get()]
+
+
+def _setup(policy):
+    events = []
+    counter = iter(range(100))
+
+    def db(context):
+        session = Session(next(counter))
+        events.append(("open", session.number))
+        yield session
+        events.append(("close", session.number))
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+    dm.register_resources(db=db)
+    dm.register_resource_recycling(db=policy)
+    return dm, events
+
+
+def test_recycle_after_max_uses():
+    """
+    Verify a Resource is recycled between top level DAL calls once it
+    reached ``max_uses``.
+    """
+    dm, events = _setup(RecyclePolicy(max_uses=2))
+
+    with dm.dal() as dal:
+        assert [dal.items.get() for __ in range(5)] == [0, 0, 1, 1, 2]
+        assert dal.items.get_twice() == [2, 2]
+        assert dal.items.get() == 3
+
+    assert events == [
+        ("open", 0),
+        ("close", 0),
+        ("open", 1),
+        ("close", 1),
+        ("open", 2),
+        ("close", 2),
+        ("open", 3),
+        ("close", 3),
+    ]
+
+
+def test_recycle_by_size_and_age():
+    """
+    Verify ``size`` and ``max_age`` limits and that pending unit of work
+    writes postpone recycling.
+    """
+    dm, events = _setup(
+        RecyclePolicy(size=lambda session: len(session.cache), max_size=3)
+    )
+
+    with dm.dal() as dal:
+        assert [dal.items.get() for __ in range(4)] == [0, 0, 0, 1]
+
+        dal.items.get()
+        dal.items.get()
+        dm.get_active_context().unit_of_work.register(list, 1, 1)
+        assert dal.items.get() == 1, "Pending writes postpone recycling"
+
+    dm, events = _setup(RecyclePolicy(max_age=0))
+    with dm.dal() as dal:
+        assert dal.items.get() == 0
+        assert dal.items.get() == 1
+
+
+def test_recycle_policy_requires_size():
+    with pytest.raises(ValueError):
+        RecyclePolicy(max_size=10)
@@ -0,0 +1,83 @@
+import threading
+
+from polydatum import DataManager, Service
+
+
+class PingService(Service):
+    def ping(self):
+        return "pong"
+
+
+class PluginService(Service):
+    def count(self):
+        return len(self._services)
+
+
+def test_concurrent_registration_and_dispatch():
+    """
+    Verify that registering Services and Resources while many threads
+    dispatch DAL calls never causes lookup errors.
+    """
+    data_manager = DataManager()
+    plugins = PluginService()
+    data_manager.register_services(ping=PingService(), plugins=plugins)
+
+    def value_resource(context):
+        yield "value"
+
+    data_manager.register_resources(value=value_resource)
+
+    errors = []
+    stop = threading.Event()
+    registered = []
+
+    def dispatch():
+        try:
+            while not stop.is_set():
+                # Everything registered before the context is entered
+                # must be visible inside it.
+                names = list(registered)
+                with data_manager.dal() as dal:
+                    assert dal.ping.ping() == "pong"
+                    assert dal["ping.ping"]() == "pong"
+                    dal.plugins.count()
+                    ctx = data_manager.require_active_context()
+                    assert ctx.value == "value"
+                    for name in names:
+                        assert getattr(dal, name).ping() == "pong"
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    def register(worker):
+        try:
+            for i in range(50):
+                name = "svc_{}_{}".format(worker, i)
+                data_manager.register_services(**{name: PingService()})
+                data_manager.register_resources(**{name: value_resource})
+                plugins.register_services(**{name: PingService()})
+                registered.append(name)
+                data_manager.replace_service("ping", PingService())
+                data_manager.replace_resource("value", value_resource)
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    dispatchers = [threading.Thread(target=dispatch) for _ in range(8)]
+    registrars = [threading.Thread(target=register, args=(i,)) for i in range(4)]
+
+    for t in dispatchers + registrars:
+        t.start()
+    for t in registrars:
+        t.join()
+    stop.set()
+    for t in dispatchers:
+        t.join()
+
+    assert errors == []
+    assert len(registered) == 200
+
+    with data_manager.dal() as dal:
+        assert dal.plugins.count() == 200
+        for name in registered:
+            assert getattr(dal, name).ping() == "pong"
+
+    assert data_manager.get_pinned_registry_versions() == []
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.context import Lazy
+from polydatum.errors import DeadlineExceeded, NotFound, ServiceError
+from polydatum.remote import DalServer, RemoteDataAccessLayer
+
+
+class ReportService(Service):
+    def build(self, year, fmt="pdf"):
+        return {"year": year, "fmt": fmt, "user": self._ctx.meta.user_id}
+
+    def timeout(self):
+        return self._ctx.remaining() is not None
+
+    def slow(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    def missing(self):
+        raise NotFound("No report")
+
+    def broken(self):
+        raise KeyError("bug")
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def server(request, tmp_path):
+    dm = DataManager()
+    dm.register_services(reports=ReportService())
+    if request.param == "unix":
+        address = str(tmp_path / "dal.sock")
+    else:
+        address = ("127.0.0.1", 0)
+    server = DalServer(dm, address).start()
+    yield server
+    server.shutdown()
+
+
+def test_remote_calls(server):
+    """
+    Verify remote calls forward arguments and the chosen local context
+    Meta. Other Meta values are not evaluated or sent.
+    """
+    local_dm = DataManager()
+    remote = RemoteDataAccessLayer(
+        server.address, data_manager=local_dm, forward_meta_keys=("user_id",)
+    )
+    lookups = []
+
+    def load_user():
+        lookups.append(1)
+        return object()
+
+    meta = {"user_id": 7, "user": Lazy(load_user)}
+    try:
+        with local_dm.context(meta=meta, timeout=10):
+            assert remote.reports.build(2024, fmt="csv") == {
+                "year": 2024,
+                "fmt": "csv",
+                "user": 7,
+            }
+            assert remote["reports.timeout"]() is True
+        assert lookups == []
+
+        assert remote.reports.build(2024)["user"] is None
+        assert remote.reports.timeout() is False
+    finally:
+        remote.close()
+
+
+def test_remote_errors(server):
+    """
+    Verify remote errors are raised as NotFound or ServiceError.
+    """
+    remote = RemoteDataAccessLayer(server.address)
+    try:
+        with pytest.raises(NotFound):
+            remote.reports.missing()
+        with pytest.raises(NotFound):
+            remote.reports.nope()
+        with pytest.raises(ServiceError) as excinfo:
+            remote.reports.broken()
+        assert excinfo.value.code == 500
+        assert excinfo.value.remote_type == "KeyError"
+        with pytest.raises(ValueError):
+            # Not encodable
+            remote.reports.build(object())
+        assert remote.reports.build(1)["year"] == 1, "Connection still usable"
+    finally:
+        remote.close()
+
+
+def test_remote_pipelining(server):
+    """
+    Verify concurrent calls are pipelined over one connection.
+    """
+    remote = RemoteDataAccessLayer(server.address, pool_size=1)
+    results = []
+    try:
+        threads = [
+            threading.Thread(target=lambda: results.append(remote.reports.slow(0.2)))
+            for __ in range(4)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - started < 0.6
+        assert results == [0.2] * 4
+        assert len(remote._connections) == 1
+    finally:
+        remote.close()
+
+
+def test_remote_timeout(server):
+    """
+    Verify a call without a response in time raises DeadlineExceeded and
+    is no longer counted as pending.
+    """
+    remote = RemoteDataAccessLayer(server.address, pool_size=1, timeout=0.05)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            remote.reports.slow(0.3)
+        assert remote._connections[0].pending == 0
+
+        time.sleep(0.3)
+        assert remote.reports.slow(0) == 0, "The late response is dropped"
+    finally:
+        remote.close()
+
+
+def test_remote_connection_lost(tmp_path):
+    dm = DataManager()
+    dm.register_services(reports=ReportService())
+    server = DalServer(dm, str(tmp_path / "dal.sock")).start()
+    remote = RemoteDataAccessLayer(server.address)
+    try:
+        assert remote.reports.slow(0) == 0
+        server.shutdown()
+        with pytest.raises(ConnectionError):
+            remote.reports.slow(0)
+    finally:
+        remote.close()
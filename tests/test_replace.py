@@ -66,3 +66,75 @@ def test_replace_unique_resource():
 
     with data_manager.context() as ctx:
         assert ctx.test == "b"
+
+
+def test_replace_service_does_not_affect_active_context():
+    """
+    Verify a context keeps using the Service that was registered when
+    it was entered and new contexts use the replacement.
+    """
+
+    class NameService(Service):
+        def __init__(self, name):
+            super().__init__()
+            self.name = name
+
+        def get_name(self):
+            return self.name
+
+    data_manager = DataManager()
+    data_manager.register_services(test=NameService("old"))
+
+    with data_manager.dal() as dal:
+        version = data_manager.get_registry().version
+        assert data_manager.get_pinned_registry_versions() == [version]
+
+        data_manager.replace_service("test", NameService("new"))
+        assert dal.test.get_name() == "old"
+
+        with data_manager.context() as ctx:
+            assert ctx.dal.test.get_name() == "new"
+            assert data_manager.get_pinned_registry_versions() == [
+                version,
+                version + 1,
+            ]
+
+        assert dal.test.get_name() == "old"
+
+    assert data_manager.get_pinned_registry_versions() == []
+
+    with data_manager.dal() as dal:
+        assert dal.test.get_name() == "new"
+
+
+def test_replace_resource_does_not_affect_active_context():
+    """
+    Verify a Resource replaced mid-context is not used by that context
+    and the original Resource is torn down by its own generator.
+    """
+    events = []
+
+    def resource_a(context):
+        events.append("a-setup")
+        yield "a"
+        events.append("a-teardown")
+
+    def resource_b(context):
+        events.append("b-setup")
+        yield "b"
+        events.append("b-teardown")
+
+    data_manager = DataManager()
+    data_manager.register_resources(test=resource_a, other=resource_a)
+
+    with data_manager.context() as ctx:
+        assert ctx.test == "a"
+        data_manager.replace_resource("test", resource_b)
+        data_manager.replace_resource("other", resource_b)
+        assert ctx.test == "a"
+        assert ctx.other == "a"
+
+    assert events == ["a-setup", "a-setup", "a-teardown", "a-teardown"]
+
+    with data_manager.context() as ctx:
+        assert ctx.test == "b"
@@ -1,8 +1,11 @@
+import threading
+import time
+
 import pytest
 
 from polydatum import DataManager
 from polydatum.errors import ResourceSetupException
-from polydatum.resources import ValueResource
+from polydatum.resources import ValueResource, WorkerResource
 
 
 def test_resource_setup_and_teardown():
@@ -140,3 +143,225 @@ def test_resource_that_has_setup_error():
     # never has a chance to recover so can't generate any new
     # errors on exit
     assert len(ctx.get_resource_exit_errors()) == 0
+
+
+def test_resource_exit_error_summaries():
+    """
+    Verify the summary exit error mode keeps capped, traceback free
+    records and the DataManager counts errors per Resource.
+    """
+
+    class SummaryDataManager(DataManager):
+        exit_error_mode = "summary"
+        max_exit_errors = 1
+
+    def failing_resource(context):
+        yield "value"
+        raise ValueError("exit failed")
+
+    data_manager = SummaryDataManager()
+    data_manager.register_resources(first=failing_resource, second=failing_resource)
+
+    with data_manager.context() as ctx:
+        assert ctx.first
+        assert ctx.second
+
+    errors = ctx.get_resource_exit_errors()
+    assert len(errors) == 1
+    assert errors[0][0] is ValueError
+    assert errors[0].message == "exit failed"
+    assert errors[0].resource == "second"
+    assert "raise ValueError" in errors[0].stack
+    assert not any(hasattr(field, "tb_frame") for field in errors[0])
+    assert data_manager.get_resource_exit_error_counts() == {"first": 1, "second": 1}
+
+    data_manager.exit_error_mode = "sumary"
+    with pytest.raises(ValueError):
+        data_manager.context()
+
+
+def _worker_resource(events, **kwargs):
+    counter = iter(range(100))
+
+    def create():
+        value = "conn{}".format(next(counter))
+        events.append(("create", value))
+        return value
+
+    return WorkerResource(
+        create,
+        reset=lambda value, exc: events.append(("reset", value, type(exc))),
+        close=lambda value: events.append(("close", value)),
+        **kwargs
+    )
+
+
+def test_worker_resource_reused_across_contexts():
+    """
+    Verify a WorkerResource keeps its value across contexts on a thread,
+    resets it with the in-context exception and closes it at shutdown.
+    """
+    events = []
+    resource = _worker_resource(events)
+    dm = DataManager()
+    dm.register_resources(conn=resource)
+
+    with dm.context() as ctx:
+        assert ctx.conn == "conn0"
+        with dm.context() as nested:
+            assert nested.conn == "conn1", "Value in use is not shared"
+
+    with pytest.raises(ValueError):
+        with dm.context() as ctx:
+            assert ctx.conn == "conn1", "One idle value is kept per thread"
+            raise ValueError()
+
+    values = []
+    thread = threading.Thread(target=lambda: values.append(_use(dm)))
+    thread.start()
+    thread.join()
+    assert values == ["conn2"], "Values are per thread"
+
+    dm.shutdown()
+
+    assert (resource.created, resource.reused) == (3, 1)
+    assert events == [
+        ("create", "conn0"),
+        ("create", "conn1"),
+        ("reset", "conn1", type(None)),
+        ("reset", "conn0", type(None)),
+        ("close", "conn0"),
+        ("reset", "conn1", ValueError),
+        ("create", "conn2"),
+        ("reset", "conn2", type(None)),
+        ("close", "conn1"),
+        ("close", "conn2"),
+    ]
+
+    with pytest.raises(RuntimeError):
+        _use(dm)
+
+
+def _use(dm):
+    with dm.context() as ctx:
+        return ctx.conn
+
+
+def test_worker_resource_validation_and_idle_timeout():
+    """
+    Verify invalid and idle values are replaced.
+    """
+    events = []
+    valid = {"conn0": False}
+    resource = _worker_resource(
+        events, validate=lambda value: valid.get(value, True), idle_timeout=0.05
+    )
+    dm = DataManager()
+    dm.register_resources(conn=resource)
+
+    assert _use(dm) == "conn0"
+    assert _use(dm) == "conn1", "Invalid value is replaced"
+    assert _use(dm) == "conn1"
+    time.sleep(0.1)
+    resource.close_idle()
+    assert ("close", "conn1") in events
+    assert _use(dm) == "conn2"
+
+
+def test_scoped_resources():
+    """
+    Verify app scoped Resources are created once, thread scoped ones once
+    per thread, and both are torn down at shutdown.
+    """
+    events = []
+    counter = iter(range(100))
+
+    def client(context):
+        number = next(counter)
+        events.append(("open", number))
+        yield number
+        events.append(("close", number))
+
+    dm = DataManager()
+    dm.register_scoped_resources("app", app_client=client)
+    dm.register_scoped_resources("thread", thread_client=client)
+    dm.register_scoped_resources("context", context_client=client)
+
+    dm.open_app_resources()
+    assert events == [("open", 0)]
+
+    with pytest.raises(ValueError):
+        with dm.context() as ctx:
+            assert ctx.app_client == 0
+            assert ctx.thread_client == 1
+            raise ValueError()
+
+    with dm.context() as ctx:
+        assert ctx.app_client == 0
+        assert ctx.thread_client == 1
+        assert ctx.context_client == 2
+
+    values = []
+
+    def use():
+        with dm.context() as ctx:
+            values.append((ctx.app_client, ctx.thread_client))
+
+    thread = threading.Thread(target=use)
+    thread.start()
+    thread.join()
+    assert values == [(0, 3)]
+    assert events[-1] == ("close", 3), "Closed when its thread ended"
+
+    dm.shutdown()
+    assert events == [
+        ("open", 0),
+        ("open", 1),
+        ("open", 2),
+        ("close", 2),
+        ("open", 3),
+        ("close", 3),
+        ("close", 0),
+        ("close", 1),
+    ]
+
+    with pytest.raises(ValueError):
+        dm.register_scoped_resources("request", other=client)
+
+
+def test_thread_resource_released_when_thread_ends():
+    """
+    Verify a thread scoped value is torn down when its thread ends, so
+    short lived threads do not leak values.
+    """
+    events = []
+    counter = iter(range(100))
+
+    def client(context):
+        number = next(counter)
+        events.append(("open", number))
+        yield number
+        events.append(("close", number))
+
+    dm = DataManager()
+    dm.register_scoped_resources("thread", client=client)
+
+    def use():
+        with dm.context() as ctx:
+            assert ctx.client == ctx.client
+
+    for __ in range(3):
+        thread = threading.Thread(target=use)
+        thread.start()
+        thread.join()
+
+    assert events == [
+        ("open", 0),
+        ("close", 0),
+        ("open", 1),
+        ("close", 1),
+        ("open", 2),
+        ("close", 2),
+    ]
+    dm.shutdown()
+    assert len(events) == 6
@@ -0,0 +1,135 @@
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.routing import ReplicaRouter
+from polydatum.services import read_only, streaming
+
+
+class Backend(object):
+    def __init__(self, name):
+        self.name = name
+
+
+def _backend(name, events):
+    def resource(context):
+        events.append("open " + name)
+        try:
+            yield Backend(name)
+        except Exception:
+            events.append("rollback " + name)
+            raise
+        else:
+            events.append("close " + name)
+
+    return resource
+
+
+class UserService(Service):
+    @read_only
+    def get(self):
+        return self._ctx.db.name
+
+    def save(self):
+        return self._ctx.db.name
+
+    @read_only
+    @streaming
+    def export(self):
+        for __ in range(3):
+            yield self._ctx.db.name
+
+
+def _setup():
+    events = []
+    router = ReplicaRouter(
+        _backend("primary", events),
+        [_backend("replica1", events), _backend("replica2", events)],
+    )
+    dm = DataManager()
+    dm.register_services(users=UserService())
+    dm.register_resources(db=router)
+    return dm, router, events
+
+
+def test_reads_go_to_replica_until_write():
+    """
+    Verify read only methods use a replica until the context writes,
+    after which the context reads its own writes from the primary.
+    """
+    dm, router, events = _setup()
+
+    with dm.dal() as dal:
+        assert dal.users.get() == "replica1"
+        assert dal.users.get() == "replica1"
+        assert router.get_outstanding() == [1, 0]
+        assert dal.users.save() == "primary"
+        assert dal.users.get() == "primary"
+
+    assert events == [
+        "open replica1",
+        "open primary",
+        "close primary",
+        "close replica1",
+    ]
+    assert router.get_outstanding() == [0, 0]
+
+
+def test_read_only_context():
+    """
+    Verify a read only context always uses a replica.
+    """
+    dm, router, events = _setup()
+
+    with dm.dal(meta={"read_only": True}) as dal:
+        assert dal.users.save() == "replica1"
+        assert dal.users.get() == "replica1"
+
+    assert events == ["open replica1", "close replica1"]
+
+
+def test_least_outstanding_replica():
+    """
+    Verify concurrent contexts are balanced across replicas.
+    """
+    dm, router, events = _setup()
+
+    with dm.dal() as dal1:
+        assert dal1.users.get() == "replica1"
+        with dm.dal() as dal2:
+            assert dal2.users.get() == "replica2"
+            assert router.get_outstanding() == [1, 1]
+            with dm.dal() as dal3:
+                assert dal3.users.get() == "replica1"
+        assert router.get_outstanding() == [1, 0]
+
+
+def test_routed_resource_propagates_exceptions():
+    """
+    Verify opened backends see the in-context exception.
+    """
+    dm, router, events = _setup()
+
+    with pytest.raises(ValueError):
+        with dm.dal() as dal:
+            dal.users.get()
+            dal.users.save()
+            raise ValueError()
+
+    assert events == [
+        "open replica1",
+        "open primary",
+        "rollback primary",
+        "rollback replica1",
+    ]
+    assert router.get_outstanding() == [0, 0]
+
+
+def test_read_only_stream_uses_replica():
+    """
+    Verify rows pulled from a read only stream are read from a replica.
+    """
+    dm, router, events = _setup()
+
+    with dm.dal() as dal:
+        rows = dal.users.export()
+    assert list(rows) == ["replica1"] * 3
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.sharding import HashRing, ShardedResource
+
+
+def test_hash_ring_minimal_key_movement():
+    """
+    Verify adding a node only moves keys to the new node.
+    """
+    ring = HashRing(["shard{}".format(i) for i in range(16)])
+    keys = ["tenant{}".format(i) for i in range(5000)]
+    before = {key: ring.get(key) for key in keys}
+
+    ring.add("shard16")
+    moved = [key for key in keys if ring.get(key) != before[key]]
+
+    assert all(ring.get(key) == "shard16" for key in moved)
+    # About 1/17th of the keys should move
+    assert 0 < len(moved) < len(keys) / 17 * 2
+
+    with pytest.raises(KeyError):
+        HashRing().get("tenant")
+
+
+def _setup(**kwargs):
+    events = []
+
+    def make_shard(name):
+        def shard(context):
+            events.append("open " + name)
+            yield name
+            events.append("close " + name)
+
+        return shard
+
+    sharded = ShardedResource(
+        {"shard{}".format(i): make_shard("shard{}".format(i)) for i in range(4)},
+        **kwargs
+    )
+
+    class ItemService(Service):
+        def get_shard(self, item_id, tenant_id=None):
+            return self._ctx.db.current
+
+        def count(self):
+            return self._ctx.db.scatter(lambda shard: [threading.current_thread().name])
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+    dm.register_resources(db=sharded)
+    return dm, sharded, events
+
+
+def test_shard_from_meta_is_lazy_and_cached():
+    """
+    Verify only the shard for the Meta key is opened, once per context.
+    """
+    dm, sharded, events = _setup(meta_key="tenant_id")
+    expected = sharded.get_shard("acme")
+
+    with dm.dal(meta={"tenant_id": "acme"}) as dal:
+        assert dal.items.get_shard(1) == expected
+        assert dal.items.get_shard(2) == expected
+
+    assert events == ["open " + expected, "close " + expected]
+
+
+def test_shard_from_arguments():
+    """
+    Verify the shard key can come from a positional or keyword argument.
+    """
+    dm, sharded, events = _setup(arg="tenant_id")
+
+    with dm.dal() as dal:
+        assert dal.items.get_shard(1, "acme") == sharded.get_shard("acme")
+        assert dal.items.get_shard(1, tenant_id="umbrella") == sharded.get_shard(
+            "umbrella"
+        )
+        with pytest.raises(LookupError):
+            dal.items.get_shard(1)
+
+
+def test_scatter_gather():
+    """
+    Verify scatter opens every shard and runs concurrently on workers.
+    """
+    dm, sharded, events = _setup()
+
+    with dm.dal() as dal:
+        results = dal.items.count()
+        assert len(results) == 4
+        assert all(name.startswith("polydatum-scatter") for name in results)
+
+    assert sorted(events) == sorted(
+        ["open shard{}".format(i) for i in range(4)]
+        + ["close shard{}".format(i) for i in range(4)]
+    )
+
+    with dm.context() as ctx:
+        assert ctx.db.scatter(lambda shard: shard, keys=["a", "a"], merge=list) == [
+            sharded.get_shard("a")
+        ]
+
+    sharded.shutdown()
+
+
+def test_add_shard():
+    """
+    Verify a shard can be added while in use.
+    """
+    dm, sharded, events = _setup(meta_key="tenant_id")
+
+    def shard4(context):
+        yield "shard4"
+
+    sharded.add_shard("shard4", shard4)
+    assert "shard4" in sharded.shards
+
+    tenant = next(
+        "tenant{}".format(i)
+        for i in range(1000)
+        if sharded.get_shard("tenant{}".format(i)) == "shard4"
+    )
+    with dm.dal(meta={"tenant_id": tenant}) as dal:
+        assert dal.items.get_shard(1) == "shard4"
+
+
+def test_scatter_error_waits_for_all_shards():
+    """
+    Verify a failing shard is only raised once every other worker is done,
+    so no shard is torn down while in use.
+    """
+    dm, sharded, events = _setup()
+
+    def fn(shard):
+        if shard == "shard0":
+            raise ValueError(shard)
+        time.sleep(0.05)
+        events.append("done " + shard)
+        return [shard]
+
+    with pytest.raises(ValueError):
+        with dm.context() as ctx:
+            ctx.db.scatter(fn)
+
+    # Every worker finished before the error left the context
+    assert sorted(e for e in events if e.startswith("done")) == [
+        "done shard1",
+        "done shard2",
+        "done shard3",
+    ]
+    sharded.shutdown()
+
+
+def test_add_shard_resizes_scatter_workers():
+    """
+    Verify shards added after the first scatter still get their own worker.
+    """
+    dm, sharded, events = _setup()
+    barrier = threading.Barrier(5, timeout=5)
+
+    def fn(shard):
+        barrier.wait()
+        return [shard]
+
+    with dm.context() as ctx:
+        assert len(ctx.db.scatter(lambda shard: [shard])) == 4
+
+    def shard4(context):
+        yield "shard4"
+
+    sharded.add_shard("shard4", shard4)
+    with dm.context() as ctx:
+        # Deadlocks unless all five shards run at once
+        assert len(ctx.db.scatter(fn)) == 5
+    sharded.shutdown()
@@ -0,0 +1,215 @@
+import gc
+
+import pytest
+
+from polydatum import DataAccessLayer, DataManager, Service
+from polydatum.services import streaming
+from polydatum.streams import DalStream
+
+
+class ExportService(Service):
+    def __init__(self):
+        super().__init__()
+        self.pulled = 0
+
+    @streaming(chunk_size=10)
+    def rows(self, count, fail_at=None):
+        db = self._ctx.db
+        for i in range(count):
+            if i == fail_at:
+                raise ValueError("Broken row")
+            self.pulled += 1
+            yield (db, i)
+
+    @streaming
+    def default_chunks(self):
+        yield from range(3)
+
+    @streaming
+    def requests(self):
+        ctx = self._ctx
+        for __ in range(2):
+            request = ctx.get_current_request()
+            yield request.path[-1].name, ctx.get_call_depth(), self._dal.exports.depth()
+
+    def depth(self):
+        return self._ctx.get_call_depth()
+
+
+def _setup():
+    events = []
+
+    def db(context):
+        events.append("db open")
+        try:
+            yield "db"
+        except Exception as e:
+            events.append("db rollback {}".format(type(e).__name__))
+            raise
+        else:
+            events.append("db close")
+
+    def middleware(context):
+        events.append("middleware setup")
+        yield
+        events.append("middleware teardown")
+
+    service = ExportService()
+    dm = DataManager()
+    dm.register_services(exports=service)
+    dm.register_resources(db=db)
+    dm.register_context_middleware(middleware)
+    return dm, service, events
+
+
+def test_stream_outlives_context_block():
+    """
+    Verify a stream keeps the context and Resources alive after the
+    ``with`` block exits and tears them down once exhausted.
+    """
+    dm, service, events = _setup()
+
+    with dm.dal() as dal:
+        rows = dal.exports.rows(25)
+        assert isinstance(rows, DalStream)
+        ctx = dm.get_active_context()
+
+    assert dm.get_active_context() is None
+    assert events == ["middleware setup"]
+
+    first = next(rows)
+    assert first == ("db", 0)
+    assert service.pulled == 10, "Pulls one chunk at a time"
+
+    assert list(rows) == [("db", i) for i in range(1, 25)]
+    assert rows.closed
+    assert events == [
+        "middleware setup",
+        "db open",
+        "middleware teardown",
+        "db close",
+    ]
+    assert dm.get_active_context() is None
+    assert ctx.get_resource_exit_errors() == []
+
+
+def test_stream_chunks_and_hooks():
+    """
+    Verify method middleware can hook each chunk.
+    """
+    dm, service, events = _setup()
+    chunk_sizes = []
+
+    def count_chunks(request, handler):
+        result = handler(request)
+        if isinstance(result, DalStream) and request.path[-1].name == "rows":
+
+            def hook(chunk):
+                chunk_sizes.append(len(chunk))
+                return [row for __, row in chunk]
+
+            result.add_chunk_hook(hook)
+        return result
+
+    dal = DataAccessLayer(dm, middleware=[count_chunks])
+
+    with dm.context():
+        rows = dal.exports.rows(25)
+        assert list(rows.chunks()) == [
+            list(range(10)),
+            list(range(10, 20)),
+            list(range(20, 25)),
+        ]
+        assert list(dal.exports.default_chunks()) == [0, 1, 2]
+
+    assert chunk_sizes[:4] == [10, 10, 5, 0]
+    assert events[-1] == "db close"
+
+
+def test_stream_closed_early():
+    """
+    Verify closing a stream early tears down the context.
+    """
+    dm, service, events = _setup()
+
+    with dm.dal() as dal:
+        rows = dal.exports.rows(100)
+
+    with rows:
+        next(rows)
+
+    assert service.pulled == 10
+    assert events[-1] == "db close"
+
+
+def test_stream_error_rolls_back():
+    """
+    Verify an error while streaming is seen by Resources and raised
+    to the consumer.
+    """
+    dm, service, events = _setup()
+
+    with dm.dal() as dal:
+        rows = dal.exports.rows(100, fail_at=15)
+
+    with pytest.raises(ValueError, match="Broken row"):
+        list(rows)
+
+    assert events[-1] == "db rollback ValueError"
+
+
+def test_in_context_error_closes_streams():
+    """
+    Verify an in-context exception tears down immediately and closes
+    open streams.
+    """
+    dm, service, events = _setup()
+
+    with pytest.raises(KeyError):
+        with dm.dal() as dal:
+            rows = dal.exports.rows(100)
+            next(rows)
+            raise KeyError()
+
+    assert rows.closed
+    assert events[-1] == "db rollback KeyError"
+    assert list(rows) == []
+
+
+def test_stream_pulls_see_originating_request():
+    """
+    Verify the Service body of a stream sees the DAL call that returned
+    the stream and its DAL calls are nested calls.
+    """
+    dm, service, events = _setup()
+    outer_calls = []
+
+    def outer_only(request, handler):
+        outer_calls.append(request.path[-1].name)
+        return handler(request)
+
+    dal = DataAccessLayer(dm, middleware=[outer_only])
+
+    with dm.context() as ctx:
+        rows = dal.exports.requests()
+    assert list(rows) == [("requests", 1, 2), ("requests", 1, 2)]
+    assert outer_calls == ["requests"]
+    assert ctx.get_call_depth() == 0
+
+
+def test_abandoned_stream_closes_context():
+    """
+    Verify a stream that is no longer referenced tears its context down
+    normally without waiting for the cyclic garbage collector.
+    """
+    dm, service, events = _setup()
+
+    gc.disable()
+    try:
+        with dm.dal() as dal:
+            rows = dal.exports.rows(100)
+        next(rows)
+        del rows
+        assert events[-2:] == ["middleware teardown", "db close"]
+    finally:
+        gc.enable()
@@ -0,0 +1,123 @@
+from functools import partial
+
+import pytest
+
+from polydatum import DataManager, Service
+from polydatum.unit_of_work import UnitOfWork
+
+
+class ItemService(Service):
+    def save(self, item_id, value):
+        self._ctx.unit_of_work.register(self._ctx.db.save_items, item_id, value)
+
+    def count(self, item_id):
+        self._ctx.unit_of_work.register(
+            self._ctx.db.save_counts, item_id, 1, merge=lambda a, b: a + b
+        )
+
+
+class Database(object):
+    def __init__(self, events):
+        self.events = events
+
+    def save_items(self, items):
+        self.events.append(("items", items))
+
+    def save_counts(self, counts):
+        self.events.append(("counts", counts))
+
+
+def _setup():
+    events = []
+
+    def db(context):
+        try:
+            yield Database(events)
+        except Exception:
+            events.append("rollback")
+            raise
+        else:
+            events.append("commit")
+
+    def middleware(context):
+        yield
+        events.append("middleware teardown")
+
+    dm = DataManager()
+    dm.register_services(items=ItemService())
+    dm.register_resources(db=db)
+    dm.register_context_middleware(middleware)
+    return dm, events
+
+
+def test_writes_are_coalesced_and_flushed_on_exit():
+    """
+    Verify writes are coalesced by key and flushed in bulk before
+    middleware and resource teardown.
+    """
+    dm, events = _setup()
+
+    with dm.dal() as dal:
+        dal.items.save(1, "a")
+        dal.items.save(2, "b")
+        dal.items.save(1, "c")
+        dal.items.count(1)
+        dal.items.count(1)
+        assert dm.get_active_context().unit_of_work.pending == 3
+        assert events == []
+
+    assert events == [
+        ("items", ["c", "b"]),
+        ("counts", [2]),
+        "middleware teardown",
+        "commit",
+    ]
+
+
+def test_writes_are_discarded_on_error():
+    """
+    Verify pending writes are discarded when the context fails.
+    """
+    dm, events = _setup()
+
+    with pytest.raises(ValueError):
+        with dm.dal() as dal:
+            dal.items.save(1, "a")
+            raise ValueError()
+
+    assert events == ["rollback"]
+
+
+def test_explicit_and_early_flush():
+    """
+    Verify flush() and the pending cap flush early.
+    """
+    dm, events = _setup()
+    dm.UnitOfWork = partial(UnitOfWork, max_pending=2)
+
+    with dm.dal() as dal:
+        dal.items.save(1, "a")
+        dm.get_active_context().unit_of_work.flush()
+        assert events == [("items", ["a"])]
+
+        for i in range(3):
+            dal.items.save(i, i)
+        assert events[-1] == ("items", [0, 1, 2])
+        assert dm.get_active_context().unit_of_work.pending == 0
+
+
+def test_flush_error_rolls_back():
+    """
+    Verify a flush error is raised and Resources see it.
+    """
+    dm, events = _setup()
+
+    def broken(values):
+        raise KeyError()
+
+    with pytest.raises(KeyError):
+        with dm.context() as ctx:
+            ctx.db
+            ctx.unit_of_work.register(broken, 1, 1)
+
+    assert events == ["rollback"]